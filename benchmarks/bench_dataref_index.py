@@ -0,0 +1,55 @@
+import copy
+import os
+import shutil
+import tempfile
+import time
+
+import fire
+
+import synthetic
+from vcell_cli_utils.cli import (get_all_dataref_and_curves, get_report_label_from_data_ref,
+                                 update_dataref_with_report_label)
+
+
+def synthetic_document(reports: int = 20, species: int = 500, plots: int = 200, curves: int = 5):
+    # get_all_dataref_and_curves() of a synthetic SED-ML shaped like a parameter scan: many reports (each of
+    # its own task), many curves
+    work_dir = tempfile.mkdtemp()
+    try:
+        sedml_path = os.path.join(work_dir, synthetic.sedml_file_name(0))
+        with open(sedml_path, 'w') as f:
+            f.write(synthetic.synthetic_sedml(tasks=reports, species=species, reports=reports, plots=plots,
+                                              curves=curves, time_points=2))
+        return get_all_dataref_and_curves(sedml_path)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def update_linear(all_report_dataref, all_plot_curves):
+    # The previous implementation: three full scans of every data set per curve
+    for plot, curves in all_plot_curves.items():
+        for curve_name, datarefs in curves.items():
+            new_ref = dict(datarefs)
+            new_ref['x'] = get_report_label_from_data_ref(datarefs['x'], all_report_dataref)[1]
+            new_ref['y'] = get_report_label_from_data_ref(datarefs['y'], all_report_dataref)[1]
+            new_ref['report'] = get_report_label_from_data_ref(datarefs['y'], all_report_dataref)[0]
+            curves[curve_name] = new_ref
+    return all_report_dataref, all_plot_curves
+
+
+def run(reports: int = 20, species: int = 500, plots: int = 200, curves: int = 5):
+    all_report_dataref, all_plot_curves = synthetic_document(reports, species, plots, curves)
+    print("{} data sets, {} curves".format(reports * (species + 1), plots * curves))
+
+    results = {}
+    for name, update in [('linear scan', update_linear), ('index', update_dataref_with_report_label)]:
+        plot_curves = copy.deepcopy(all_plot_curves)
+        start = time.perf_counter()
+        results[name] = update(all_report_dataref, plot_curves)[1]
+        print("{:<12} {:>10.2f} ms".format(name, (time.perf_counter() - start) * 1e3))
+
+    assert results['linear scan'] == results['index']
+
+
+if __name__ == "__main__":
+    fire.Fire(run)
@@ -0,0 +1,63 @@
+import re
+import subprocess
+import sys
+
+import fire
+
+# Seconds of cumulative import time allowed per entry point (see `python -X importtime`)
+BUDGETS = {
+    'vcell_cli_utils.client': 0.05,
+    'vcell_cli_utils.status': 0.1,
+    'vcell_cli_utils.cli': 0.1,
+    'vcell_cli_utils.server': 0.15,
+}
+
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+
+def import_times(module: str):
+    # [(cumulative seconds, module, depth)] for one fresh interpreter importing `module`
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            check=True, capture_output=True, text=True)
+    times = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            times.append((int(match.group(2)) / 1e6, match.group(4), (len(match.group(3)) - 1) // 2))
+    return times
+
+
+def direct_imports(times: list, module: str):
+    # importtime lists children before their parent, walk back from `module` to the previous top-level entry
+    index = next(i for i, (seconds, name, depth) in enumerate(times) if name == module and depth == 0)
+    children = []
+    for seconds, name, depth in reversed(times[:index]):
+        if depth == 0:
+            break
+        if depth == 1:
+            children.append((seconds, name, depth))
+    return children
+
+
+def run(repeat: int = 5, top: int = 5):
+    over_budget = []
+    for module, budget in BUDGETS.items():
+        runs = [import_times(module) for _ in range(repeat)]
+        best = min(runs, key=lambda times: next(t for t, name, depth in times if name == module))
+        total = next(t for t, name, depth in best if name == module)
+        status = 'ok' if total <= budget else 'OVER BUDGET'
+        print("{:<26} {:>8.1f} ms  (budget {:>6.1f} ms)  {}".format(module, total * 1e3, budget * 1e3, status))
+
+        heaviest = sorted(direct_imports(best, module), reverse=True)[:top]
+        for seconds, name, depth in heaviest:
+            print("    {:<40} {:>8.1f} ms".format(name, seconds * 1e3))
+
+        if total > budget:
+            over_budget.append(module)
+
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    fire.Fire(run)
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import time
+
+import fire
+import matplotlib.pyplot as plt
+import numpy as np
+
+from vcell_cli_utils.plots import DECIMATORS, PLOT_SIZE, render_plot
+
+# raster resolution the decimated plots are compared at against the full one
+COMPARE_DPI = 100
+# darkest channel below this: the pixel is part of a line
+INK_LEVEL = 128
+
+
+def synthetic_curves(time_points: int, curves: int):
+    # long noisy oscillations with spikes, the worst case for keeping a line's shape
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 1000, time_points)
+    plot_curves = []
+    for i_curve in range(curves):
+        y = np.sin(x / (5 + i_curve)) * (1 + i_curve) + rng.normal(0, 0.05, time_points)
+        y[rng.integers(0, time_points, 20)] += 3
+        plot_curves.append(('s_{}'.format(i_curve), 'time', x, y))
+    return plot_curves
+
+
+def raster(curves: list, decimate: str = None):
+    # the plot as pixels, lines only (no legend / labels) so a difference is a difference of shape
+    fig, ax = plt.subplots(figsize=PLOT_SIZE)
+    try:
+        for label, x_label, x, y in curves:
+            if decimate:
+                x, y = DECIMATORS[decimate](x, y)
+            ax.plot(x, y)
+        fig.canvas.draw()
+        return np.asarray(fig.canvas.buffer_rgba())[..., :3].copy()
+    finally:
+        plt.close(fig)
+
+
+def run(time_points: int = 1000000, curves: int = 4, seaborn: bool = True):
+    # seaborn with every point is the current output; pass --noseaborn to skip it for very long curves
+    plt.rcParams['figure.dpi'] = COMPARE_DPI
+    plot_curves = synthetic_curves(time_points, curves)
+    out_dir = tempfile.mkdtemp()
+    try:
+        variants = [('seaborn', None), ('seaborn', 'minmax'), ('matplotlib', None), ('matplotlib', 'minmax'),
+                    ('matplotlib', 'lttb')]
+        if not seaborn:
+            variants = [variant for variant in variants if variant != ('seaborn', None)]
+
+        print("{} curves x {} time points".format(curves, time_points))
+        for engine, decimate in variants:
+            pdf_path = os.path.join(out_dir, '{}_{}.pdf'.format(engine, decimate))
+            start = time.perf_counter()
+            render_plot(pdf_path, plot_curves, decimate=decimate or 'none', engine=engine)
+            elapsed = time.perf_counter() - start
+            print("  {:<11} {:<7} {:>8.2f} s  {:>9.1f} KB".format(
+                engine, decimate or 'full', elapsed, os.path.getsize(pdf_path) / 1024))
+
+        # inked (non-white) pixels of the full plot the decimated one misses or adds
+        full = raster(plot_curves).min(axis=-1) < INK_LEVEL
+        for decimate in DECIMATORS:
+            decimated = raster(plot_curves, decimate).min(axis=-1) < INK_LEVEL
+            print("  {:<7} vs full at {} dpi: {:.2f} % of the line pixels differ".format(
+                decimate, COMPARE_DPI, 100 * (full != decimated).sum() / full.sum()))
+    finally:
+        shutil.rmtree(out_dir)
+
+
+if __name__ == "__main__":
+    fire.Fire(run)
@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import fire
+import numpy as np
+from biosimulators_utils.report.data_model import DataSetResults
+from biosimulators_utils.sedml.data_model import DataSet, Report
+
+from vcell_cli_utils.reports import Hdf5ReportColumns, Hdf5ReportSession, ReportFrameCache
+
+LOCATION = 'simulation.sedml'
+
+
+def write_report(out_dir: str, data_sets: int, time_points: int, **h5_options):
+    # <out_dir>/<location>/report.csv in VCell's row layout, and the same report in reports.h5
+    rng = np.random.default_rng(0)
+    labels = ['time'] + ['s_{}'.format(i) for i in range(data_sets)]
+    values = np.vstack([np.linspace(0, 100, time_points), rng.random((data_sets, time_points))])
+
+    result_out_dir = os.path.join(out_dir, LOCATION)
+    os.makedirs(result_out_dir, exist_ok=True)
+    with open(os.path.join(result_out_dir, 'report.csv'), 'w') as f:
+        for label, row in zip(labels, values):
+            f.write(label + ',' + ','.join(repr(value) for value in row.tolist()) + '\n')
+
+    report = Report(id='report', name='report', data_sets=[DataSet(id=label, label=label, name=label)
+                                                           for label in labels])
+    results = DataSetResults({label: row for label, row in zip(labels, values)})
+    with Hdf5ReportSession(out_dir, **h5_options) as h5_writer:
+        h5_writer.write(report, results, os.path.join(LOCATION, 'report'))
+    return result_out_dir, labels
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def run(data_sets: int = 2000, time_points: int = 2000, curves: int = 10):
+    # Time and traced peak memory of fetching the x / y data of `curves` curves of one large report
+    work_dir = tempfile.mkdtemp()
+    try:
+        for name, h5_options in [('gzip, chunked', dict(chunks=True, compression='gzip', compression_opts=9)),
+                                 ('contiguous', dict(chunks=False, compression=None))]:
+            out_dir = os.path.join(work_dir, name.replace(', ', '_'))
+            result_out_dir, labels = write_report(out_dir, data_sets, time_points, **h5_options)
+            curve_labels = labels[1:curves + 1]
+
+            def from_csv():
+                frames = ReportFrameCache(result_out_dir)
+                for label in curve_labels:
+                    frames.column('report', labels[0])
+                    frames.column('report', label)
+
+            def from_h5():
+                with Hdf5ReportColumns(os.path.join(out_dir, 'reports.h5'), LOCATION) as columns:
+                    for label in curve_labels:
+                        columns.column('report', labels[0])
+                        columns.column('report', label)
+
+            print("{} data sets x {} time points, {} curves, reports.h5 {}:".format(
+                data_sets, time_points, curves, name))
+            for source, func in [('report.csv (pandas)', from_csv), ('reports.h5 rows', from_h5)]:
+                elapsed, peak = measure(func)
+                print("  {:<22} {:>8.3f} s  peak {:>8.1f} MB traced".format(source, elapsed, peak / 2 ** 20))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    fire.Fire(run)
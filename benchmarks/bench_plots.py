@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import time
+
+import fire
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+from vcell_cli_utils.plots import PLOT_DPI, PLOT_SIZE, render_plots
+from vcell_cli_utils.reports import read_vcell_csv
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures', 'simulation_1.sedml')
+FIGURES = ['Figure_3a', 'Figure_3b', 'Figure_3c', 'Figure_3d']
+
+
+def load_plot_jobs(out_dir: str, csv_dir: str = FIXTURES_DIR, max_curves: int = 4):
+    # Every fixture figure plots its first `max_curves` data sets against time
+    plot_jobs = []
+    for figure in FIGURES:
+        data_sets = read_vcell_csv(os.path.join(csv_dir, figure + '.csv'))
+        labels = list(data_sets.keys())
+        x_label = labels[0]
+        curves = [(label, x_label, data_sets[x_label], data_sets[label]) for label in labels[1:max_curves + 1]]
+        plot_jobs.append((os.path.join(out_dir, figure + '.pdf'), curves))
+    return plot_jobs
+
+
+def render_legacy(plot_jobs: list):
+    # What gen_plots_for_sed2d_only did: savefig after every curve and never close the figure
+    for pdf_path, curves in plot_jobs:
+        fig, ax = plt.subplots(figsize=PLOT_SIZE)
+        for label, x_label, x, y in curves:
+            sns.lineplot(x=x, y=y, ax=ax, label=label)
+            ax.set_ylabel('')
+            plt.savefig(pdf_path, dpi=PLOT_DPI)
+
+
+def run(workers: int = os.cpu_count(), max_curves: int = 4):
+    out_dir = tempfile.mkdtemp()
+    try:
+        plot_jobs = load_plot_jobs(out_dir, max_curves=max_curves)
+
+        start = time.perf_counter()
+        render_legacy(plot_jobs)
+        legacy = time.perf_counter() - start
+        open_figures = len(plt.get_fignums())
+        plt.close('all')
+        print("{:<28} {:>8.2f} s  ({} figures left open)".format('legacy (savefig per curve)', legacy, open_figures))
+
+        for num_workers in sorted({1, workers}):
+            start = time.perf_counter()
+            render_plots(plot_jobs, workers=num_workers)
+            elapsed = time.perf_counter() - start
+            print("{:<28} {:>8.2f} s  ({} figures left open, {:.1f}x)".format(
+                'render_plots workers={}'.format(num_workers), elapsed, len(plt.get_fignums()), legacy / elapsed))
+    finally:
+        shutil.rmtree(out_dir)
+
+
+if __name__ == "__main__":
+    fire.Fire(run)
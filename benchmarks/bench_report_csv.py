@@ -0,0 +1,56 @@
+import glob
+import os
+import shutil
+import tempfile
+import timeit
+
+import fire
+import pandas as pd
+from biosimulators_utils.report.data_model import DataSetResults
+from biosimulators_utils.report.io import ReportWriter
+from biosimulators_utils.sedml.data_model import DataSet, Report
+
+from vcell_cli_utils.reports import read_vcell_csv
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures', 'simulation_1.sedml')
+
+
+def read_pandas(csv_file_path: str):
+    # The exec_sed_doc parsing this replaced: header read, transpose, reset, rename, transpose back
+    data_set_df = pd.read_csv(csv_file_path).transpose()
+    data_set_df.columns = data_set_df.iloc[0]
+    data_set_df = data_set_df.drop(data_set_df.iloc[0].name)
+    data_set_df = data_set_df.reset_index()
+    data_set_df = data_set_df.rename(columns={'index': data_set_df.columns.name})
+    data_set_df = data_set_df.transpose()
+    data_set_df.index.name = None
+    return {label: data_set_df.loc[label, :].to_numpy(dtype='float64') for label in data_set_df.index}
+
+
+def write_h5(data_set_arrays: dict, out_dir: str, report_id: str):
+    report = Report(id=report_id, name=report_id,
+                    data_sets=[DataSet(id=label, label=label, name=label) for label in data_set_arrays])
+    data_set_results = DataSetResults(data_set_arrays)
+    ReportWriter().run(report, data_set_results, out_dir, os.path.join('simulation_1.sedml', report_id), format='h5')
+
+
+def run(csv_dir: str = FIXTURES_DIR, repeat: int = 5, number: int = 10):
+    csv_files = sorted(glob.glob(os.path.join(csv_dir, '*.csv')))
+    out_dir = tempfile.mkdtemp()
+    try:
+        print("{:<20} {:>12} {:>12} {:>12} {:>12}".format(
+            'file', 'pandas (ms)', 'fast (ms)', 'speedup', 'h5 (ms)'))
+        for csv_file in csv_files:
+            report_id = os.path.splitext(os.path.basename(csv_file))[0]
+            legacy = min(timeit.repeat(lambda: read_pandas(csv_file), repeat=repeat, number=number)) / number
+            fast = min(timeit.repeat(lambda: read_vcell_csv(csv_file), repeat=repeat, number=number)) / number
+            arrays = read_vcell_csv(csv_file)
+            h5 = min(timeit.repeat(lambda: write_h5(arrays, out_dir, report_id), repeat=repeat, number=1))
+            print("{:<20} {:>12.2f} {:>12.2f} {:>11.1f}x {:>12.2f}".format(
+                os.path.basename(csv_file), legacy * 1e3, fast * 1e3, legacy / fast, h5 * 1e3))
+    finally:
+        shutil.rmtree(out_dir)
+
+
+if __name__ == "__main__":
+    fire.Fire(run)
@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fire
+
+import synthetic
+
+STATUS_PY = os.path.join(os.path.dirname(__file__), '..', 'vcell_cli_utils', 'status.py')
+SEDML = synthetic.sedml_file_name(0)
+
+
+def update_args(out_dir: str, tasks: int, species: int):
+    # every task and every data set (time and one per species) goes RUNNING, then every one SUCCEEDED, each
+    # update on its own. The updates of a phase run in any order, so a phase starts once the previous one is done.
+    data_sets = ['ds_0_time'] + ['ds_0_{}'.format(synthetic.species_id(i)) for i in range(species)]
+    phases = []
+    for status in ('RUNNING', 'SUCCEEDED'):
+        args = [['updateTaskStatus', SEDML, 'task_{}'.format(i), status, out_dir] for i in range(tasks)]
+        args += [['updateDataSetStatus', SEDML, 'report_0', data_set, status, out_dir] for data_set in data_sets]
+        phases.append(args)
+    return phases
+
+
+def run_process(args: list, env: dict):
+    # what the Java runner does: one status.py process per update
+    subprocess.run([sys.executable, STATUS_PY] + args, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def run_in_fork(args: list):
+    from vcell_cli_utils import status
+    command = status.commands[args[0]]
+    command(*args[1:])
+
+
+def check(out_dir: str, tasks: int, species: int):
+    # number of updates missing from the final status (status.yml, exported first for a sqlite store)
+    from vcell_cli_utils import status_store
+    from vcell_cli_utils.status import flush_status
+
+    flush_status(out_dir)
+    status_store._stores.clear()
+    doc = status_store.load_yaml(os.path.join(out_dir, status_store.STATUS_FILE_NAME))
+    sed_doc = doc['sedDocuments'][SEDML]
+    lost = sum(1 for task in sed_doc['tasks'].values() if task['status'] != 'SUCCEEDED')
+    lost += sum(1 for status in sed_doc['outputs']['report_0']['dataSets'].values() if status != 'SUCCEEDED')
+    lost += (tasks + species + 1) - len(sed_doc['tasks']) - len(sed_doc['outputs']['report_0']['dataSets'])
+    return lost
+
+
+def run(tasks: int = 20, species: int = 100, concurrency: int = 16, mode: str = 'process',
+        backends: tuple = ('yaml', 'sqlite')):
+    # mode: 'process' (a status.py interpreter per update) or 'fork' (pool of forked workers, no start-up cost)
+    work_dir = tempfile.mkdtemp()
+    failed = False
+    try:
+        omex_file = os.path.join(work_dir, 'synthetic.omex')
+        synthetic.write_archive(omex_file, tasks=tasks, species=species, reports=1, plots=0)
+
+        for backend in backends:
+            out_dir = os.path.join(work_dir, backend)
+            os.makedirs(out_dir)
+            env = dict(os.environ, VCELL_STATUS_STORE=backend)
+            subprocess.run([sys.executable, STATUS_PY, 'genStatusYaml', omex_file, out_dir], env=env, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            phases = update_args(out_dir, tasks, species)
+            updates = sum(len(args) for args in phases)
+
+            start = time.perf_counter()
+            if mode == 'process':
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    for all_args in phases:
+                        list(pool.map(lambda args: run_process(args, env), all_args))
+            else:
+                os.environ['VCELL_STATUS_STORE'] = backend
+                from vcell_cli_utils import status_store
+                status_store.store_backend = backend
+                with multiprocessing.get_context('fork').Pool(concurrency) as pool:
+                    for all_args in phases:
+                        pool.map(run_in_fork, all_args, chunksize=1)
+            elapsed = time.perf_counter() - start
+
+            lost = check(out_dir, tasks, species)
+            failed = failed or lost > 0
+            print("{:<7} {} updates, {} at a time ({}): {:>7.2f} s, {:>7.1f} updates/s, {} lost".format(
+                backend, updates, concurrency, mode, elapsed, updates / elapsed, lost))
+    finally:
+        shutil.rmtree(work_dir)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    fire.Fire(run)
@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import fire
+import yaml
+
+import synthetic
+from vcell_cli_utils import status, status_store
+from vcell_cli_utils.sedml_cache import sedml_summary
+from vcell_cli_utils.workspace import open_workspace
+
+
+def legacy_status_yml(omex_file: str, out_dir: str):
+    # The previous status_yml: per-document intermediate dicts merged and copied into the final document,
+    # then one yaml.dump string from the pure-Python emitter
+    yaml_dict = {}
+    with open_workspace(omex_file) as workspace:
+        for sedml in workspace.sedml_files:
+            outputs_dict = {"outputs": {}}
+            tasks_dict = {"tasks": {}}
+            sedml_doc = sedml_summary(workspace.file_path(sedml))
+            plots_dict = {}
+            reports_dict = {}
+            for plot in sedml_doc['outputs']:
+                if plot['type'] == 'plot2D':
+                    plots_dict[plot['id']] = [curve['id'] for curve in plot['curves']]
+                elif plot['type'] == 'report':
+                    reports_dict[plot['id']] = [data_set['id'] for data_set in plot['data_sets']]
+            for plot in list(plots_dict.keys()):
+                curves_dict = {}
+                for curve in plots_dict[plot]:
+                    curves_dict[curve] = 'SUCCEEDED'
+                outputs_dict["outputs"].update({plot: {"curves": curves_dict}})
+                outputs_dict["outputs"][plot].update({"status": "SUCCEEDED"})
+            for report in list(reports_dict.keys()):
+                dataset_dict = {}
+                for dataset in reports_dict[report]:
+                    dataset_dict[dataset] = 'QUEUED'
+                outputs_dict["outputs"].update({report: {"dataSets": dataset_dict}})
+                outputs_dict["outputs"][report].update({"status": "QUEUED"})
+            for task in sedml_doc['tasks']:
+                tasks_dict["tasks"].update({task: {"status": "QUEUED"}})
+            sed_doc_dict = {sedml: {}}
+            sed_doc_dict[sedml].update(outputs_dict)
+            sed_doc_dict[sedml].update(tasks_dict)
+            sed_doc_dict[sedml].update({"status": "QUEUED"})
+            yaml_dict[sedml] = sed_doc_dict[sedml]
+    final_dict = {}
+    final_dict['sedDocuments'] = dict(yaml_dict)
+    final_dict['status'] = "QUEUED"
+    status_store.write_atomic(os.path.join(out_dir, status_store.STATUS_FILE_NAME), yaml.dump(final_dict))
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def run(tasks: int = 100, species: int = 2000, reports: int = 20, plots: int = 200, curves: int = 10):
+    # a report of every species (time and species data sets), see synthetic.py
+    work_dir = tempfile.mkdtemp()
+    try:
+        omex_file = os.path.join(work_dir, 'synthetic.omex')
+        synthetic.write_archive(omex_file, tasks=tasks, species=species, reports=reports, plots=plots,
+                                curves=curves)
+        legacy_dir = os.path.join(work_dir, 'legacy')
+        new_dir = os.path.join(work_dir, 'new')
+        os.makedirs(legacy_dir)
+        os.makedirs(new_dir)
+
+        # SED-ML parsing is the same for both (and cached), time building and writing the status tree
+        with open_workspace(omex_file) as workspace:
+            start = time.perf_counter()
+            for sedml in workspace.sedml_files:
+                sedml_summary(workspace.file_path(sedml))
+        print("{} data sets, {} curves, {} tasks; SED-ML parsed in {:.2f} s".format(
+            reports * (species + 1), plots * curves, tasks, time.perf_counter() - start))
+
+        for name, func, out_dir in [('legacy (yaml.dump)', legacy_status_yml, legacy_dir),
+                                    ('status_yml', status.status_yml, new_dir)]:
+            elapsed, peak = measure(func, omex_file, out_dir)
+            size = os.path.getsize(os.path.join(out_dir, status_store.STATUS_FILE_NAME))
+            print("{:<22} {:>8.2f} s  peak {:>7.1f} MB traced  ({:.1f} MB status.yml)".format(
+                name, elapsed, peak / 2 ** 20, size / 2 ** 20))
+
+        with open(os.path.join(legacy_dir, status_store.STATUS_FILE_NAME)) as f_legacy, \
+                open(os.path.join(new_dir, status_store.STATUS_FILE_NAME)) as f_new:
+            assert f_legacy.read() == f_new.read(), 'status.yml differs'
+
+        status_path = os.path.join(new_dir, status_store.STATUS_FILE_NAME)
+        for name, loader in [('load (SafeLoader)', yaml.SafeLoader), ('load ({})'.format(
+                status_store.YamlLoader.__name__), status_store.YamlLoader)]:
+            start = time.perf_counter()
+            with open(status_path) as f:
+                yaml.load(f, loader)
+            print("{:<22} {:>8.2f} s".format(name, time.perf_counter() - start))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    fire.Fire(run)
@@ -0,0 +1,269 @@
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import fire
+
+import synthetic
+from vcell_cli_utils import cli, profiling, status, status_store
+from vcell_cli_utils._version import __version__
+from vcell_cli_utils.workspace import forked_child_cleanup
+
+# Archive sizes (see synthetic.py) the suite runs at; `large` is opt-in (--scales=small,medium,large)
+SCALES = {
+    'small': dict(documents=1, tasks=1, species=20, reports=1, plots=2, curves=4, time_points=201),
+    'medium': dict(documents=2, tasks=4, species=100, reports=4, plots=10, curves=8, time_points=2001),
+    'large': dict(documents=2, tasks=10, species=200, reports=10, plots=40, curves=10, time_points=10001),
+}
+DEFAULT_SCALES = ('small', 'medium')
+
+# A slower / bigger operation only counts as a regression past both the relative tolerance and these
+MIN_WALL_DIFF = 0.05
+MIN_MEMORY_DIFF_KB = 10 * 1024
+
+
+def _measure_in_child(func, args: tuple, conn):
+    # the operation's wall / CPU time, peak RSS and (for profiled commands) the time of each stage
+    profile_path = os.path.join(tempfile.mkdtemp(), 'profile.jsonl')
+    profiling.profile_path = profile_path
+    try:
+        with forked_child_cleanup():
+            start_rss = profiling.peak_rss_kb()
+            start_wall = time.perf_counter()
+            start_cpu = time.process_time()
+            func(*args)
+            status_store.flush_all()
+            result = {
+                'wall': time.perf_counter() - start_wall,
+                'cpu': time.process_time() - start_cpu,
+                'peak_rss_kb': profiling.peak_rss_kb(),
+            }
+            result['rss_growth_kb'] = result['peak_rss_kb'] - start_rss
+
+            stages = defaultdict(float)
+            if os.path.isfile(profile_path):
+                with open(profile_path) as f:
+                    for line in f:
+                        for stage in json.loads(line)['stages']:
+                            stages[stage['stage']] += stage['wall']
+            result['stages'] = {name: round(wall, 6) for name, wall in sorted(stages.items())}
+            conn.send(result)
+    except Exception as exception:
+        conn.send({'error': '{}: {}'.format(type(exception).__name__, exception)})
+    finally:
+        conn.close()
+        shutil.rmtree(os.path.dirname(profile_path), ignore_errors=True)
+
+
+def measure(func, *args):
+    # runs func(*args) in a child forked from this (preloaded) interpreter, so every operation starts from the
+    # same state: nothing cached from the previous one, its own peak RSS
+    ctx = multiprocessing.get_context('fork')
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_measure_in_child, args=(func, args, child_conn))
+    proc.start()
+    child_conn.close()
+    try:
+        result = parent_conn.recv()
+    except EOFError:
+        result = {'error': 'crashed (exit code {})'.format(proc.exitcode)}
+    parent_conn.close()
+    proc.join()
+    if 'error' in result:
+        raise RuntimeError("{}{} failed: {}".format(getattr(func, '__name__', func), args, result['error']))
+    return result
+
+
+def measure_calls(calls: list):
+    # one child per call, like the Java runner's one process per status update; the mean of every measure
+    results = [measure(func, *args) for func, args in calls]
+    mean = {key: sum(result[key] for result in results) / len(results)
+            for key in ('wall', 'cpu', 'peak_rss_kb', 'rss_growth_kb')}
+    mean['calls'] = len(results)
+    return mean
+
+
+def status_calls(sizes: dict, out_dir: str, count: int):
+    # `count` task and data set updates spread over the archive's SED documents, tasks and reports
+    task_calls = []
+    data_set_calls = []
+    for i_call in range(count):
+        sedml = synthetic.sedml_file_name(i_call % sizes['documents'])
+        new_status = status_store.RUNNING if i_call % 2 == 0 else status_store.SUCCEEDED
+        task_calls.append((status.update_status, (sedml, 'task_{}'.format(i_call % sizes['tasks']), new_status,
+                                                  out_dir)))
+        i_report = i_call % sizes['reports']
+        data_set_calls.append((status.update_dataset_status, (
+            sedml, 'report_{}'.format(i_report),
+            'ds_{}_{}'.format(i_report, synthetic.species_id(i_call % sizes['species'])), new_status, out_dir)))
+    return task_calls, data_set_calls
+
+
+def _with_backend(backend: str, func):
+    def run(*args):
+        status_store.store_backend = backend
+        return func(*args)
+    run.__name__ = getattr(func, '__name__', 'run')
+    return run
+
+
+def gen_plot_pdfs(gen_dir: str, out_dir: str, documents: int, reports_h5: str = None):
+    # every SED document's plots, all drawn again
+    for i_document in range(documents):
+        sedml = synthetic.sedml_file_name(i_document)
+        cli.gen_plot_pdfs(os.path.join(gen_dir, 'temp', sedml), os.path.join(out_dir, sedml), force=True,
+                          reports_h5=reports_h5)
+
+
+def run_scale(sizes: dict, work_dir: str, status_count: int = 10):
+    # The pipeline of one synthetic archive, operation by operation, each timed in its own child
+    omex_file = os.path.join(work_dir, 'synthetic.omex')
+    out_dir = os.path.join(work_dir, 'out')
+    sqlite_dir = os.path.join(work_dir, 'out_sqlite')
+    gen_dir = os.path.join(work_dir, 'gen')
+    for path in (out_dir, sqlite_dir, gen_dir):
+        os.makedirs(path)
+
+    start = time.perf_counter()
+    synthetic.write_archive(omex_file, **sizes)
+    csv_file_paths = synthetic.write_results(out_dir, **sizes)
+    print("  generated in {:.2f} s ({:.1f} MB of report CSVs)".format(
+        time.perf_counter() - start, sum(os.path.getsize(path) for path in csv_file_paths) / 2 ** 20))
+
+    operations = {}
+    operations['genStatusYaml'] = measure(_with_backend('yaml', status.status_yml), omex_file, out_dir)
+    task_calls, data_set_calls = status_calls(sizes, out_dir, status_count)
+    operations['updateTaskStatus'] = measure_calls([(_with_backend('yaml', func), args)
+                                                    for func, args in task_calls])
+    operations['updateDataSetStatus'] = measure_calls([(_with_backend('yaml', func), args)
+                                                       for func, args in data_set_calls])
+
+    operations['genStatusYaml[sqlite]'] = measure(_with_backend('sqlite', status.status_yml), omex_file, sqlite_dir)
+    task_calls, data_set_calls = status_calls(sizes, sqlite_dir, status_count)
+    operations['updateTaskStatus[sqlite]'] = measure_calls([(_with_backend('sqlite', func), args)
+                                                            for func, args in task_calls])
+    operations['updateDataSetStatus[sqlite]'] = measure_calls([(_with_backend('sqlite', func), args)
+                                                               for func, args in data_set_calls])
+
+    operations['genSedml2d3d'] = measure(cli.gen_sedml_2d_3d, omex_file, gen_dir)
+    operations['execSedDoc'] = measure(cli.exec_sed_doc, omex_file, out_dir)
+    operations['genPlotPdfs'] = measure(gen_plot_pdfs, gen_dir, out_dir, sizes['documents'])
+    operations['genPlotPdfs[h5]'] = measure(gen_plot_pdfs, gen_dir, out_dir, sizes['documents'],
+                                            os.path.join(out_dir, 'reports.h5'))
+
+    transpose_csv = os.path.join(work_dir, 'transpose.csv')
+    shutil.copyfile(csv_file_paths[0], transpose_csv)
+    operations['transposeVcmlCsv'] = measure(cli.transpose_vcml_csv, transpose_csv)
+    return operations
+
+
+def compare(baseline: dict, results: dict, tolerance: float = 0.25):
+    # [(scale, operation, measure, baseline value, new value)] of everything slower / bigger than the baseline by
+    # more than `tolerance` (relative) and MIN_WALL_DIFF / MIN_MEMORY_DIFF_KB (absolute)
+    regressions = []
+    for scale, scale_results in results['scales'].items():
+        baseline_scale = baseline.get('scales', {}).get(scale)
+        if baseline_scale is None or baseline_scale['sizes'] != scale_results['sizes']:
+            continue
+        for operation, result in scale_results['operations'].items():
+            baseline_result = baseline_scale['operations'].get(operation)
+            if baseline_result is None:
+                continue
+            for key, min_diff in (('wall', MIN_WALL_DIFF), ('rss_growth_kb', MIN_MEMORY_DIFF_KB)):
+                old, new = baseline_result[key], result[key]
+                if new > old * (1 + tolerance) and new - old > min_diff:
+                    regressions.append((scale, operation, key, old, new))
+    return regressions
+
+
+def print_results(results: dict, baseline: dict = None):
+    for scale, scale_results in results['scales'].items():
+        baseline_operations = ((baseline or {}).get('scales', {}).get(scale) or {}).get('operations', {})
+        print("{} {}".format(scale, ' '.join('{}={}'.format(key, value)
+                                           for key, value in scale_results['sizes'].items())))
+        for operation, result in scale_results['operations'].items():
+            line = "  {:<28} {:>9.3f} s  peak {:>8.1f} MB  +{:>7.1f} MB".format(
+                operation, result['wall'], result['peak_rss_kb'] / 1024, result['rss_growth_kb'] / 1024)
+            baseline_result = baseline_operations.get(operation)
+            if baseline_result:
+                line += "  (baseline {:.3f} s, {:.2f}x)".format(
+                    baseline_result['wall'], result['wall'] / baseline_result['wall'] if baseline_result['wall']
+                    else float('inf'))
+            print(line)
+
+
+def run(scales=DEFAULT_SCALES, output: str = None, baseline: str = None, tolerance: float = 0.25,
+        status_count: int = 10, save_baseline: bool = False):
+    # python bench_suite.py [--scales small,medium,large] [--output results.json] [--baseline baseline.json]
+    #                       [--tolerance 0.25] [--save_baseline]
+    # Timings depend on the machine: compared only against a --baseline recorded on it (--save_baseline), and
+    # not at all while that file doesn't exist yet. Exit code 1 when an operation got slower / bigger than in the
+    # baseline (see compare())
+    from vcell_cli_utils.server import preload
+
+    if save_baseline and not baseline:
+        raise ValueError("--save_baseline needs the --baseline file to write")
+    if isinstance(scales, str):
+        scales = scales.split(',')
+    unknown = [scale for scale in scales if scale not in SCALES]
+    if unknown:
+        raise ValueError("Unknown scales {}, expected some of {}".format(', '.join(unknown), ', '.join(SCALES)))
+
+    preload()
+    results = {
+        'version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'scales': {},
+    }
+    for scale in scales:
+        print("{}:".format(scale))
+        work_dir = tempfile.mkdtemp()
+        try:
+            operations = run_scale(SCALES[scale], work_dir, status_count=status_count)
+        finally:
+            shutil.rmtree(work_dir)
+        results['scales'][scale] = {
+            'sizes': SCALES[scale],
+            'operations': {operation: {key: round(value, 6) if isinstance(value, float) else value
+                                       for key, value in result.items()}
+                           for operation, result in operations.items()},
+        }
+
+    baseline_results = None
+    if baseline and not save_baseline:
+        if os.path.isfile(baseline):
+            with open(baseline) as f:
+                baseline_results = json.load(f)
+        else:
+            print("no baseline at {}, not compared (record one with --save_baseline)".format(baseline))
+    print_results(results, baseline_results)
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=1)
+    if save_baseline:
+        with open(baseline, 'w') as f:
+            json.dump(results, f, indent=1)
+        print("baseline saved to {}".format(baseline))
+        return
+
+    if baseline_results is not None:
+        regressions = compare(baseline_results, results, tolerance=tolerance)
+        for scale, operation, key, old, new in regressions:
+            print("REGRESSION {} {} {}: {:.3f} -> {:.3f}".format(scale, operation, key, old, new))
+        if regressions:
+            sys.exit(1)
+        print("no regressions against {} (tolerance {:.0%})".format(baseline, tolerance))
+
+
+if __name__ == "__main__":
+    fire.Fire(run)
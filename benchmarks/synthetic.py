@@ -0,0 +1,161 @@
+import os
+import zipfile
+
+import fire
+import numpy as np
+
+# Sizes of a synthetic archive: SED documents, tasks per document, species (one data generator per species and
+# task some report has), reports per document (time + every species of one task), plots per document, curves per plot and
+# time points of every report
+DEFAULT_SIZES = dict(documents=1, tasks=1, species=20, reports=1, plots=2, curves=4, time_points=201)
+
+MODEL_FILE_NAME = 'model.xml'
+
+MANIFEST_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<omexManifest xmlns="http://identifiers.org/combine.specifications/omex-manifest">
+  <content location="." format="http://identifiers.org/combine.specifications/omex"/>
+  <content location="./{}" format="http://identifiers.org/combine.specifications/sbml" master="false"/>
+""".format(MODEL_FILE_NAME)
+MANIFEST_SEDML = ('  <content location="./{}" format="http://identifiers.org/combine.specifications/sed-ml" '
+                  'master="true"/>\n')
+
+SPECIES_TARGET = "/sbml:sbml/sbml:model/sbml:listOfSpecies/sbml:species[@id=&apos;{}&apos;]"
+
+
+def sedml_file_name(i_document: int):
+    return 'simulation_{}.sedml'.format(i_document)
+
+
+def species_id(i_species: int):
+    return 's_{}'.format(i_species)
+
+
+def report_task(i_report: int, tasks: int):
+    return i_report % tasks
+
+
+def synthetic_sbml(species: int):
+    # species in one compartment, no reactions: all SedmlSimulationReader needs to validate the targets
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<sbml xmlns="http://www.sbml.org/sbml/level2/version4" level="2" version="4">',
+             '  <model id="model" name="synthetic">',
+             '    <listOfCompartments>',
+             '      <compartment id="c" size="1"/>',
+             '    </listOfCompartments>',
+             '    <listOfSpecies>']
+    lines += ['      <species id="{0}" name="{0}" compartment="c" initialConcentration="1"/>'.format(species_id(i))
+              for i in range(species)]
+    lines += ['    </listOfSpecies>', '  </model>', '</sbml>']
+    return '\n'.join(lines) + '\n'
+
+
+def synthetic_sedml(tasks: int, species: int, reports: int, plots: int, curves: int, time_points: int):
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<sedML xmlns="http://sed-ml.org/sed-ml/level1/version3" level="1" version="3"',
+             '  xmlns:sbml="http://www.sbml.org/sbml/level2/version4">',
+             '  <listOfModels>',
+             '    <model id="model" language="urn:sedml:language:sbml" source="{}"/>'.format(MODEL_FILE_NAME),
+             '  </listOfModels>',
+             '  <listOfSimulations>',
+             '    <uniformTimeCourse id="sim" initialTime="0" outputStartTime="0" outputEndTime="100" '
+             'numberOfPoints="{}">'.format(time_points - 1),
+             '      <algorithm kisaoID="KISAO:0000019"/>',
+             '    </uniformTimeCourse>',
+             '  </listOfSimulations>',
+             '  <listOfTasks>']
+    lines += ['    <task id="task_{}" modelReference="model" simulationReference="sim"/>'.format(i_task)
+              for i_task in range(tasks)]
+    lines += ['  </listOfTasks>', '  <listOfDataGenerators>']
+    for i_task in sorted({report_task(i_report, tasks) for i_report in range(reports)}):
+        lines += ['    <dataGenerator id="dg_{0}_time" name="time">'.format(i_task),
+                  '      <math xmlns="http://www.w3.org/1998/Math/MathML"><ci> var_{}_time </ci></math>'.format(i_task),
+                  '      <listOfVariables>',
+                  '        <variable id="var_{0}_time" symbol="urn:sedml:symbol:time" taskReference="task_{0}"/>'
+                  .format(i_task),
+                  '      </listOfVariables>',
+                  '    </dataGenerator>']
+        for i_species in range(species):
+            name = species_id(i_species)
+            lines += ['    <dataGenerator id="dg_{}_{}" name="{}">'.format(i_task, name, name),
+                      '      <math xmlns="http://www.w3.org/1998/Math/MathML"><ci> var_{}_{} </ci></math>'.format(
+                          i_task, name),
+                      '      <listOfVariables>',
+                      '        <variable id="var_{0}_{1}" target="{2}" taskReference="task_{0}"/>'.format(
+                          i_task, name, SPECIES_TARGET.format(name)),
+                      '      </listOfVariables>',
+                      '    </dataGenerator>']
+    lines += ['  </listOfDataGenerators>', '  <listOfOutputs>']
+    for i_report in range(reports):
+        i_task = report_task(i_report, tasks)
+        lines += ['    <report id="report_{}">'.format(i_report), '      <listOfDataSets>',
+                  '        <dataSet id="ds_{0}_time" label="time" dataReference="dg_{1}_time"/>'.format(
+                      i_report, i_task)]
+        lines += ['        <dataSet id="ds_{0}_{1}" label="{1}" dataReference="dg_{2}_{1}"/>'.format(
+            i_report, species_id(i_species), i_task) for i_species in range(species)]
+        lines += ['      </listOfDataSets>', '    </report>']
+    for i_plot in range(plots):
+        # curves of a task some report has, so every data reference resolves
+        i_task = report_task(i_plot % reports, tasks)
+        lines += ['    <plot2D id="plot_{}">'.format(i_plot), '      <listOfCurves>']
+        lines += ['        <curve id="curve_{0}_{1}" logX="false" logY="false" xDataReference="dg_{2}_time" '
+                  'yDataReference="dg_{2}_{3}"/>'.format(i_plot, i_curve, i_task,
+                                                         species_id((i_plot + i_curve) % species))
+                  for i_curve in range(curves)]
+        lines += ['      </listOfCurves>', '    </plot2D>']
+    lines += ['  </listOfOutputs>', '</sedML>']
+    return '\n'.join(lines) + '\n'
+
+
+def write_archive(omex_file: str, documents: int = 1, tasks: int = 1, species: int = 20, reports: int = 1,
+                  plots: int = 2, curves: int = 4, time_points: int = 201):
+    manifest = MANIFEST_HEADER + ''.join(MANIFEST_SEDML.format(sedml_file_name(i_document))
+                                         for i_document in range(documents))
+    manifest += '</omexManifest>\n'
+
+    sedml_text = synthetic_sedml(tasks, species, reports, plots, curves, time_points)
+    with zipfile.ZipFile(omex_file, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('manifest.xml', manifest)
+        zf.writestr(MODEL_FILE_NAME, synthetic_sbml(species))
+        for i_document in range(documents):
+            zf.writestr(sedml_file_name(i_document), sedml_text)
+
+
+def write_report_csv(csv_file_path: str, labels: list, values: np.ndarray):
+    # VCell's layout: one row per data set, label then values
+    with open(csv_file_path, 'w', newline='') as f:
+        for label, row in zip(labels, values):
+            f.write(label + ',' + ','.join(map(repr, row.tolist())) + '\n')
+
+
+def write_results(out_dir: str, documents: int = 1, tasks: int = 1, species: int = 20, reports: int = 1,
+                  plots: int = 2, curves: int = 4, time_points: int = 201, seed: int = 0):
+    # the report CSVs the simulator would write to <out_dir>/<SED document>/<report>.csv
+    rng = np.random.default_rng(seed)
+    labels = ['time'] + [species_id(i_species) for i_species in range(species)]
+    time = np.linspace(0, 100, time_points)
+    csv_file_paths = []
+    for i_document in range(documents):
+        result_out_dir = os.path.join(out_dir, sedml_file_name(i_document))
+        os.makedirs(result_out_dir, exist_ok=True)
+        for i_report in range(reports):
+            # smooth-ish trajectories: random walks
+            values = np.vstack([time, np.cumsum(rng.normal(0, 0.1, (species, time_points)), axis=1) + 1])
+            csv_file_path = os.path.join(result_out_dir, 'report_{}.csv'.format(i_report))
+            write_report_csv(csv_file_path, labels, values)
+            csv_file_paths.append(csv_file_path)
+    return csv_file_paths
+
+
+def main(omex_file: str, out_dir: str = None, **sizes):
+    # python synthetic.py <omex> [<out_dir> for the report CSVs] [--documents N] [--tasks N] [--species N] ...
+    unknown = set(sizes) - set(DEFAULT_SIZES)
+    if unknown:
+        raise ValueError("Unknown sizes: {}".format(', '.join(sorted(unknown))))
+    sizes = dict(DEFAULT_SIZES, **sizes)
+    write_archive(omex_file, **sizes)
+    if out_dir:
+        write_results(out_dir, **sizes)
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,203 @@
+import multiprocessing
+import os
+
+import pytest
+
+from vcell_cli_utils import status, status_store
+
+SEDML = 'simulation.sedml'
+REPORT = 'report_0'
+BACKENDS = ('yaml', 'sqlite')
+
+
+def status_doc(tasks: int, data_sets: int):
+    # what genStatusYaml writes for one SED document with `tasks` tasks and one report of `data_sets` data sets
+    return {
+        'sedDocuments': {
+            SEDML: {
+                'outputs': {
+                    REPORT: {
+                        'dataSets': {'ds_{}'.format(i): status_store.QUEUED for i in range(data_sets)},
+                        'status': status_store.QUEUED,
+                    },
+                },
+                'tasks': {'task_{}'.format(i): {'status': status_store.QUEUED} for i in range(tasks)},
+                'status': status_store.QUEUED,
+            },
+        },
+        'status': status_store.QUEUED,
+    }
+
+
+def exported_doc(out_dir: str):
+    # status.yml as a fresh process reads it, exported first for a sqlite store
+    status_store._stores.clear()
+    status.flush_status(out_dir)
+    status_store._stores.clear()
+    return status_store.load_yaml(os.path.join(out_dir, status_store.STATUS_FILE_NAME))
+
+
+@pytest.fixture(params=BACKENDS)
+def out_dir(request, tmp_path, monkeypatch):
+    # an output directory with a fresh status store of each backend, updates written right away
+    monkeypatch.setattr(status_store, 'store_backend', request.param)
+    monkeypatch.setattr(status_store, 'default_flush_interval', 0.0)
+    monkeypatch.setattr(status_store, 'record_durations', False)
+    monkeypatch.setattr(status_store, '_stores', {})
+    out_dir = str(tmp_path)
+    store = status_store.get_store(out_dir)
+    store.reset(status_doc(tasks=20, data_sets=100))
+    store.flush()
+    # forked children open their own store (and sqlite connection)
+    status_store._stores.clear()
+    return out_dir
+
+
+def _run_update(args: tuple):
+    status.commands[args[0]](*args[1:])
+
+
+def test_concurrent_updates_lose_nothing(out_dir):
+    # every task and data set RUNNING, then every one SUCCEEDED, each update a separate call in one of 16 forked
+    # workers
+    with multiprocessing.get_context('fork').Pool(16) as pool:
+        for new_status in (status_store.RUNNING, status_store.SUCCEEDED):
+            updates = [('updateTaskStatus', SEDML, 'task_{}'.format(i), new_status, out_dir) for i in range(20)]
+            updates += [('updateDataSetStatus', SEDML, REPORT, 'ds_{}'.format(i), new_status, out_dir)
+                        for i in range(100)]
+            pool.map(_run_update, updates, chunksize=1)
+
+    sed_doc = exported_doc(out_dir)['sedDocuments'][SEDML]
+    lost = [task for task, task_dict in sed_doc['tasks'].items() if task_dict['status'] != status_store.SUCCEEDED]
+    lost += [data_set for data_set, data_set_status in sed_doc['outputs'][REPORT]['dataSets'].items()
+             if data_set_status != status_store.SUCCEEDED]
+    assert lost == []
+    assert sed_doc['status'] == status_store.SUCCEEDED
+    assert sed_doc['outputs'][REPORT]['status'] == status_store.SUCCEEDED
+
+
+def write_updates(path: str, lines: list):
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return path
+
+
+@pytest.mark.parametrize('as_list', [False, True])
+def test_batch_applies_every_update(out_dir, tmp_path, as_list):
+    # from a file, or the lines themselves as client.py sends its stdin
+    lines = [
+        '{"sedml": "%s", "task": "task_0", "status": "RUNNING"}' % SEDML,
+        '{"sedml": "%s", "report": "%s", "dataset": "ds_0", "status": "SUCCEEDED"}' % (SEDML, REPORT),
+        '{"status": "RUNNING"}',
+    ]
+    status.update_status_batch(out_dir, lines if as_list else write_updates(str(tmp_path / 'updates.jsonl'), lines))
+
+    doc = exported_doc(out_dir)
+    assert doc['status'] == status_store.RUNNING
+    assert doc['sedDocuments'][SEDML]['tasks']['task_0']['status'] == status_store.RUNNING
+    assert doc['sedDocuments'][SEDML]['outputs'][REPORT]['dataSets']['ds_0'] == status_store.SUCCEEDED
+
+
+@pytest.mark.parametrize('line', [
+    # misspelled key: would otherwise be taken for a simulation status update
+    '{"sedml": "%s", "report": "%s", "dataSet": "ds_0", "status": "FAILED"}' % (SEDML, REPORT),
+    '{"sedml": "%s", "status": "FAILED"}' % SEDML,
+    '{"task": "task_0", "status": "FAILED"}',
+    '{"status": 1}',
+    '["FAILED"]',
+    'not json',
+])
+def test_malformed_update_changes_nothing(out_dir, tmp_path, line):
+    before = exported_doc(out_dir)
+    updates = write_updates(str(tmp_path / 'updates.jsonl'), [
+        '{"sedml": "%s", "task": "task_0", "status": "RUNNING"}' % SEDML,
+        line,
+    ])
+    with pytest.raises(ValueError):
+        status.update_status_batch(out_dir, updates)
+    assert exported_doc(out_dir) == before
+
+
+def test_failed_batch_changes_nothing(out_dir, tmp_path):
+    before = exported_doc(out_dir)
+    updates = write_updates(str(tmp_path / 'updates.jsonl'), [
+        '{"sedml": "%s", "task": "task_0", "status": "RUNNING"}' % SEDML,
+        '{"sedml": "%s", "task": "nope", "status": "RUNNING"}' % SEDML,
+    ])
+    with pytest.raises(KeyError):
+        status.update_status_batch(out_dir, updates)
+    assert exported_doc(out_dir) == before
+
+    # a store kept in memory (server mode) is back to the status on disk after a failed batch, too
+    store = status_store.get_store(out_dir)
+    with pytest.raises(KeyError):
+        with store.batch():
+            store.set_task_status(SEDML, 'task_0', status_store.RUNNING)
+            store.set_task_status(SEDML, 'nope', status_store.RUNNING)
+    assert store.aggregate_status(sedml=SEDML) == status_store.QUEUED
+    store.set_task_status(SEDML, 'task_1', status_store.SUCCEEDED)
+    assert store.task_counts(SEDML) == {status_store.QUEUED: 19, status_store.SUCCEEDED: 1}
+
+
+FIXTURE_OMEX = os.path.join(os.path.dirname(__file__), 'fixtures',
+                            'Ciliberto-J-Cell-Biol-2003-morphogenesis-checkpoint-continuous.omex')
+
+
+def test_sqlite_export_matches_yaml(tmp_path, monkeypatch):
+    # the same status commands on each store, from genStatusYaml to the final simStatus: the same status.yml
+    monkeypatch.setattr(status_store, 'default_flush_interval', 0.0)
+    monkeypatch.setattr(status_store, 'record_durations', False)
+    monkeypatch.setattr(status_store, '_stores', {})
+    sedml = 'simulation_1.sedml'
+    docs = {}
+    for backend in BACKENDS:
+        monkeypatch.setattr(status_store, 'store_backend', backend)
+        out_dir = str(tmp_path / backend)
+        os.makedirs(out_dir)
+        status.status_yml(FIXTURE_OMEX, out_dir)
+        status.sim_status(status_store.RUNNING, out_dir)
+        status.update_status(sedml, 'task_1', status_store.RUNNING, out_dir)
+        status.update_dataset_status(sedml, 'report', 'data_set_time', status_store.SUCCEEDED, out_dir)
+        status.update_dataset_status(sedml, 'report', 'data_set_Clb', status_store.FAILED, out_dir)
+        status.update_dataset_status(sedml, 'report', 'data_set_Cln', status_store.RUNNING, out_dir)
+        status.update_status(sedml, 'task_1', status_store.SUCCEEDED, out_dir)
+        status.sim_status(status_store.SUCCEEDED, out_dir)
+        docs[backend] = exported_doc(out_dir)
+
+    assert docs['sqlite'] == docs['yaml']
+    assert docs['yaml']['sedDocuments'][sedml]['outputs']['report']['status'] == status_store.FAILED
+
+
+def test_sqlite_store_seeded_from_yaml(tmp_path, monkeypatch):
+    # status.yml of the YAML store (and an empty status.sqlite a failed open used to leave): the sqlite store
+    # starts from status.yml, auto-detection keeps the YAML store until the sidecar has its tables
+    monkeypatch.setattr(status_store, 'default_flush_interval', 0.0)
+    monkeypatch.setattr(status_store, 'record_durations', False)
+    monkeypatch.setattr(status_store, '_stores', {})
+    out_dir = str(tmp_path)
+    monkeypatch.setattr(status_store, 'store_backend', 'yaml')
+    status_store.get_store(out_dir).reset(status_doc(tasks=2, data_sets=2))
+    status.update_status(SEDML, 'task_0', status_store.RUNNING, out_dir)
+    (tmp_path / 'status.sqlite').write_bytes(b'')
+
+    monkeypatch.setattr(status_store, 'store_backend', None)
+    status_store._stores.clear()
+    assert isinstance(status_store.get_store(out_dir), status_store.StatusStore)
+
+    monkeypatch.setattr(status_store, 'store_backend', 'sqlite')
+    status_store._stores.clear()
+    status.update_status(SEDML, 'task_1', status_store.SUCCEEDED, out_dir)
+    tasks = exported_doc(out_dir)['sedDocuments'][SEDML]['tasks']
+    assert tasks == {'task_0': {'status': status_store.RUNNING}, 'task_1': {'status': status_store.SUCCEEDED}}
+
+    monkeypatch.setattr(status_store, 'store_backend', None)
+    status_store._stores.clear()
+    assert not isinstance(status_store.get_store(out_dir), status_store.StatusStore)
+
+
+def test_sqlite_store_needs_a_status(tmp_path, monkeypatch):
+    monkeypatch.setattr(status_store, 'store_backend', 'sqlite')
+    monkeypatch.setattr(status_store, '_stores', {})
+    with pytest.raises(FileNotFoundError):
+        status.sim_status(status_store.RUNNING, str(tmp_path))
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,174 @@
+import glob
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import sys
+import time
+import traceback
+
+from vcell_cli_utils import cli, status, status_store
+from vcell_cli_utils.workspace import forked_child_cleanup, open_workspace
+
+SUMMARY_FILE_NAME = 'batch_summary.json'
+
+
+def find_archives(archives: list):
+    # [(omex file, output name)] for archives and directories of archives (searched recursively)
+    jobs = []
+    names = set()
+    for path in archives:
+        if os.path.isdir(path):
+            omex_files = sorted(glob.glob(os.path.join(path, '**', '*.omex'), recursive=True))
+            rel_names = [os.path.splitext(os.path.relpath(omex_file, path))[0] for omex_file in omex_files]
+        else:
+            omex_files = [path]
+            rel_names = [os.path.splitext(os.path.basename(path))[0]]
+
+        for omex_file, name in zip(omex_files, rel_names):
+            unique_name = name
+            i_name = 1
+            while unique_name in names:
+                i_name += 1
+                unique_name = '{}_{}'.format(name, i_name)
+            names.add(unique_name)
+            jobs.append((omex_file, unique_name))
+    return jobs
+
+
+def gen_archive_plot_pdfs(omex_file: str, out_dir: str, force: bool = False):
+    # plots of every SED-ML document whose results are in <out_dir>/<location>, drawn from the reports.h5
+    # execSedDoc just wrote rather than parsing the CSVs again
+    from biosimulators_utils.config import get_config
+
+    reports_h5 = os.path.join(out_dir, get_config().H5_REPORTS_PATH)
+    with open_workspace(omex_file) as workspace:
+        for content in workspace.sedml_contents:
+            result_out_dir = os.path.join(out_dir, content.location)
+            if os.path.isdir(result_out_dir):
+                cli.gen_plot_pdfs(workspace.file_path(content.location), result_out_dir, force=force,
+                                  reports_h5=reports_h5 if os.path.isfile(reports_h5) else None)
+
+
+def process_archive(omex_file: str, out_dir: str, plots: bool = True, force: bool = False):
+    # The status / convert / plot pipeline of one archive; a failure ends this archive only
+    steps = [
+        ('genStatusYaml', lambda: status.status_yml(omex_file, out_dir)),
+        ('genSedml2d3d', lambda: cli.gen_sedml_2d_3d(omex_file, out_dir)),
+        ('execSedDoc', lambda: cli.exec_sed_doc(omex_file, out_dir, force=force)),
+    ]
+    if plots:
+        steps.append(('genPlotPdfs', lambda: gen_archive_plot_pdfs(omex_file, out_dir, force=force)))
+
+    result = {'archive': omex_file, 'out_dir': out_dir, 'status': status_store.SUCCEEDED, 'timings': {}}
+    start = time.perf_counter()
+    # runs in a child forked by run_batch
+    with forked_child_cleanup():
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+            for step, run_step in steps:
+                step_start = time.perf_counter()
+                result['step'] = step
+                run_step()
+                result['timings'][step] = round(time.perf_counter() - step_start, 3)
+            del result['step']
+        except Exception as exception:
+            result['status'] = status_store.FAILED
+            result['error'] = {
+                'type': type(exception).__name__,
+                'message': str(exception),
+                'traceback': traceback.format_exc(),
+            }
+    result['timings']['total'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def _process_archive_in_child(args: tuple, conn):
+    try:
+        conn.send(process_archive(*args))
+    finally:
+        conn.close()
+
+
+def run_batch(out_dir: str, archives: list, workers: int = os.cpu_count(), plots: bool = True,
+              force: bool = False):
+    # Every archive runs in its own child forked from this (preloaded) interpreter, at most `workers` at a
+    # time: children share the warm imports and a native crash only fails its own archive
+    from vcell_cli_utils.server import preload
+
+    jobs = [(omex_file, os.path.join(out_dir, name), plots, force) for omex_file, name in find_archives(archives)]
+
+    preload()
+    ctx = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+
+    start = time.perf_counter()
+    results = {}
+    pending = list(enumerate(jobs))
+    running = {}
+    while pending or running:
+        while pending and len(running) < max(workers, 1):
+            i_job, job = pending.pop(0)
+            parent_conn, child_conn = ctx.Pipe(duplex=False)
+            proc = ctx.Process(target=_process_archive_in_child, args=(job, child_conn))
+            proc.start()
+            child_conn.close()
+            running[parent_conn] = (i_job, job, proc, time.perf_counter())
+
+        for conn in multiprocessing.connection.wait(list(running.keys())):
+            i_job, job, proc, job_start = running.pop(conn)
+            try:
+                result = conn.recv()
+            except EOFError:
+                result = None
+            conn.close()
+            proc.join()
+
+            if result is None:
+                result = {
+                    'archive': job[0],
+                    'out_dir': job[1],
+                    'status': status_store.FAILED,
+                    'timings': {'total': round(time.perf_counter() - job_start, 3)},
+                    'error': {
+                        'type': 'ChildProcessError',
+                        'message': "Archive process exited with code {}".format(proc.exitcode),
+                    },
+                }
+            results[i_job] = result
+
+    results = [results[i_job] for i_job in range(len(jobs))]
+    summary = {
+        'archives': len(results),
+        'succeeded': sum(1 for result in results if result['status'] == status_store.SUCCEEDED),
+        'failed': sum(1 for result in results if result['status'] != status_store.SUCCEEDED),
+        'workers': workers,
+        'wall_time': round(time.perf_counter() - start, 3),
+        'results': results,
+    }
+
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    status_store.write_atomic(os.path.join(out_dir, SUMMARY_FILE_NAME), json.dumps(summary, indent=2))
+    return summary
+
+
+def main(out_dir: str, *archives, workers: int = os.cpu_count(), plots: bool = True, force: bool = False):
+    # python batch.py <out dir> <archive or directory> ... [--workers N] [--noplots] [--force]
+    summary = run_batch(out_dir, list(archives), workers=workers, plots=plots, force=force)
+
+    for result in summary['results']:
+        error = result.get('error')
+        print("{:<10} {:>8.2f} s  {}{}".format(
+            result['status'], result['timings']['total'], result['archive'],
+            '  ({} in {}: {})'.format(error['type'], result.get('step', '?'), error['message']) if error else ''))
+    print("{} archives, {} succeeded, {} failed in {:.2f} s; summary in {}".format(
+        summary['archives'], summary['succeeded'], summary['failed'], summary['wall_time'],
+        os.path.join(out_dir, SUMMARY_FILE_NAME)))
+
+    if summary['failed']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    import fire
+    fire.Fire(main)
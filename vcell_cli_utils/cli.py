@@ -1,48 +1,39 @@
-from biosimulators_utils.log.data_model import Status, CombineArchiveLog, SedDocumentLog  # noqa: F401
-from biosimulators_utils.plot.data_model import PlotFormat  # noqa: F401
-from biosimulators_utils.report.data_model import DataSetResults, ReportResults, ReportFormat  # noqa: F401
-from biosimulators_utils.report.io import ReportWriter, ReportReader
-from biosimulators_utils.sedml.io import SedmlSimulationReader, SedmlSimulationWriter
-from biosimulators_utils.combine.utils import get_sedml_contents
-from biosimulators_utils.combine.io import CombineArchiveReader
-from biosimulators_utils.sedml.data_model import Output, Report, Plot2D, Plot3D, DataSet
-import fire
+# Heavy dependencies (pandas, matplotlib, libsedml, biosimulators_utils) are imported inside the commands
+# that need them, so a command only pays for the part of the stack it actually uses
 import glob
 import os
-import pandas as pd
-import shutil
-import tempfile
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import libsedml as lsed
-from libsedml import SedReport, SedPlot2D
-import sys
 import stat
-
-# Move status PY code here
-# Create temp directory
-tmp_dir = tempfile.mkdtemp()
+from vcell_cli_utils.profiling import profiled, stage
+from vcell_cli_utils.workspace import open_workspace
 
 
+@profiled('genSedml2d3d')
 def gen_sedml_2d_3d(omex_file_path, base_out_path):
+    from biosimulators_utils.sedml.data_model import Report, Plot2D, Plot3D, DataSet
+    from biosimulators_utils.sedml.io import SedmlSimulationWriter
+    from vcell_cli_utils.sedml_cache import read_sed_doc
 
     temp_path = os.path.join(base_out_path, "temp")
     if not os.path.exists(temp_path):
         os.mkdir(temp_path, stat.S_IRWXU | stat.S_IRWXG | stat.S_IRWXO)
 
-    # defining archive
-    archive = CombineArchiveReader().run(in_file=omex_file_path, out_dir=temp_path,
-                                         try_reading_as_plain_zip_archive=False)
+    with open_workspace(omex_file_path) as workspace:
+        if 'manifest.xml' not in workspace.file_names:
+            raise ValueError("`{}` is not a valid COMBINE/OMEX archive.".format(omex_file_path))
+
+        # the rewritten SED-ML files below reference the archive's models relative to temp_path
+        with stage('archive_copy'):
+            workspace.copy_to(temp_path)
 
-    # determine files to execute
-    sedml_contents = get_sedml_contents(archive)
+        # determine files to execute
+        sedml_contents = workspace.sedml_contents
 
     for i_content, content in enumerate(sedml_contents):
         content_filename = os.path.join(temp_path, content.location)
         sedml_name = content.location.split('/')[1].split('.')[0]
 
-        doc = SedmlSimulationReader().run(content_filename)
+        # a copy, the plot reports are appended to it
+        doc = read_sed_doc(content_filename)
         for output in doc.outputs:
             if isinstance(output, (Plot2D, Plot3D)):
                 report = Report(
@@ -75,193 +66,416 @@ def gen_sedml_2d_3d(omex_file_path, base_out_path):
 
         filename_with_reports_for_plots = os.path.join(
             temp_path, f'simulation_{sedml_name}.sedml')
-        SedmlSimulationWriter().run(doc, filename_with_reports_for_plots,
-                                    validate_models_with_languages=False)
-
-
-def exec_plot_output_sed_doc(omex_file_path, base_out_path):
-    archive = CombineArchiveReader().run(in_file=omex_file_path, out_dir=tmp_dir,
-                                         try_reading_as_plain_zip_archive=True)
-
-    # determine files to execute
-    sedml_contents = get_sedml_contents(archive)
-
-    report_results = ReportResults()
-    for i_content, content in enumerate(sedml_contents):
-        content_filename = os.path.join(tmp_dir, content.location)
-
-        for report_filename in glob.glob(os.path.join(base_out_path, content.location, '*.csv')):
-            if report_filename.find('__plot__') != -1:
-                report_id = os.path.splitext(
-                    os.path.basename(report_filename))[0]
-
-                # read report from CSV file produced by tellurium
-                # data_set_df = pd.read_csv(report_filename).transpose()
-
-                data_set_df = pd.read_csv(report_filename, header=None).T
-                data_set_df.columns = data_set_df.iloc[0]
-                data_set_df.drop(0, inplace=True)
-                data_set_df.reset_index(inplace=True)
-                data_set_df.drop('index', axis=1, inplace=True)
-
-                # create pseudo-report for ReportWriter
-                datasets = []
-                for col in list(data_set_df.columns):
-                    datasets.append(DataSet(id=col, label=col, name=col))
-                #report.data_sets = datasets
-                report = Report(id=report_id, name=report_id,
-                                data_sets=datasets)
+        with stage('sedml_write', sedml=content.location):
+            SedmlSimulationWriter().run(doc, filename_with_reports_for_plots,
+                                        validate_models_with_languages=False)
+
+
+def get_report_rel_path(location, report_id):
+    # path of a report's data set in reports.h5
+    rel_path = os.path.join(location, report_id)
+    if len(rel_path.split("./")) > 1:
+        rel_path = rel_path.split("./")[1]
+    return rel_path
+
+
+def get_h5_location(reports_h5, result_out_dir):
+    # location of the SED document whose results are in result_out_dir (<dir of reports.h5>/<location>)
+    return os.path.relpath(os.path.abspath(result_out_dir), os.path.dirname(os.path.abspath(reports_h5)))
+
+
+def open_report_columns(reports_h5, result_out_dir):
+    # reports.h5 columns of the SED document whose results are in result_out_dir
+    from vcell_cli_utils.reports import Hdf5ReportColumns
+
+    return Hdf5ReportColumns(reports_h5, get_h5_location(reports_h5, result_out_dir))
+
+
+def get_sed_report_results(output, data_set_arrays):
+    # (Report, DataSetResults) to write to reports.h5 for one parsed report CSV of an output of the SED-ML
+    from biosimulators_utils.report.data_model import DataSetResults
+    from biosimulators_utils.sedml.data_model import Report, DataSet
+
+    report = Report(id=output['id'], name=output['name'], data_sets=[
+        DataSet(id=data_set['id'], label=data_set['label'], name=data_set['name'])
+        for data_set in output['data_sets']])
+
+    data_set_results = DataSetResults()
+
+    if output['type'] not in ('plot2D', 'plot3D'):
+        # Considering the scenario where it has the datasets in sedml
+        for data_set in report.data_sets:
+            data_set_results[data_set.id] = data_set_arrays[data_set.label]
+    else:
+        # Considering the scenario where it doesn't have datasets in sedml (pseudo sedml for plots)
+        for col, values in data_set_arrays.items():
+            data_set_results[col] = values
+        report.data_sets = [DataSet(id=col, label=col, name=col) for col in data_set_arrays.keys()]
+
+    return report, data_set_results
+
+
+@profiled('execPlotOutputSedDoc')
+def exec_plot_output_sed_doc(omex_file_path, base_out_path, workers: int = 1, executor: str = 'process',
+                             h5_chunks: bool = True, h5_compression: str = 'gzip', h5_compression_level: int = 9,
+                             force: bool = False):
+    from biosimulators_utils.report.data_model import DataSetResults
+    from biosimulators_utils.sedml.data_model import Report, DataSet
+    from vcell_cli_utils.manifest import OutputManifest
+    from vcell_cli_utils.reports import Hdf5ReportSession, read_vcell_csvs
+
+    with open_workspace(omex_file_path) as workspace:
+        # determine files to execute
+        sedml_contents = workspace.sedml_contents
+
+    # one reports.h5 handle for every report of the archive; reports whose CSV is unchanged since they were
+    # last written (see manifest.py) are neither parsed nor written again, unless `force`
+    with OutputManifest(base_out_path, force=force) as manifest, \
+            Hdf5ReportSession(base_out_path, chunks=h5_chunks, compression=h5_compression,
+                              compression_opts=h5_compression_level) as h5_writer:
+        h5_options = dict(chunks=h5_chunks, compression=h5_compression, compression_level=h5_compression_level)
+
+        report_filenames = {}
+        stale_reports = {}
+        for content in sedml_contents:
+            report_filenames[content.location] = [
+                report_filename for report_filename in glob.glob(os.path.join(base_out_path, content.location, '*.csv'))
+                if report_filename.find('__plot__') != -1]
+            for report_filename in report_filenames[content.location]:
+                report_id = os.path.splitext(os.path.basename(report_filename))[0]
+                rel_path = get_report_rel_path(content.location, report_id.replace('__plot__', ''))
+                signature = manifest.signature([report_filename], **h5_options)
+                if not (manifest.is_current('reports.h5:' + rel_path, signature) and h5_writer.contains(rel_path)):
+                    stale_reports[report_filename] = (rel_path, signature)
+
+        # CSVs are parsed by the pool (workers > 1), the HDF5 writes below stay serial and in order
+        parsed_reports = read_vcell_csvs([report_filename for filenames in report_filenames.values()
+                                          for report_filename in filenames if report_filename in stale_reports],
+                                         workers=workers, executor=executor)
+
+        for i_content, content in enumerate(sedml_contents):
+            for report_filename in report_filenames[content.location]:
+                if report_filename in stale_reports:
+                    report_id = os.path.splitext(
+                        os.path.basename(report_filename))[0]
+                    rel_path, signature = stale_reports[report_filename]
+
+                    # read report from CSV file produced by tellurium (parsed in advance by the pool, if any)
+                    with stage('csv_parse', sedml=content.location, report=rel_path):
+                        data_set_arrays = next(parsed_reports)
+
+                    # create pseudo-report for ReportWriter
+                    datasets = []
+                    for col in data_set_arrays.keys():
+                        datasets.append(DataSet(id=col, label=col, name=col))
+                    #report.data_sets = datasets
+                    report = Report(id=report_id, name=report_id,
+                                    data_sets=datasets)
+
+                    data_set_results = DataSetResults()
+
+                    for col, values in data_set_arrays.items():
+                        data_set_results[col] = values
+
+                    # append to data structure of report results
+
+                    # save file in desired BioSimulators format(s)
+                    export_id = report_id.replace('__plot__', '')
+                    report.id = export_id
+                    with stage('h5_write', sedml=content.location, report=rel_path):
+                        h5_writer.write(report, data_set_results, rel_path)
+                    manifest.record('reports.h5:' + rel_path, signature)
 
-                data_set_results = DataSetResults()
-
-                for col in list(data_set_df.columns):
-                    data_set_results[col] = data_set_df[col].values
-
-                # append to data structure of report results
-
-                # save file in desired BioSimulators format(s)
-                export_id = report_id.replace('__plot__', '')
-                report.id = export_id
-                rel_path = os.path.join(
-                    content.location, report.id)
-                if len(rel_path.split("./")) > 1:
-                    rel_path = rel_path.split("./")[1]
-                ReportWriter().run(report,
-                                   data_set_results,
-                                   base_out_path,
-                                   rel_path,
-                                   format='h5')
                 os.rename(report_filename,
                           report_filename.replace('__plot__', ''))
 
 
-def exec_sed_doc(omex_file_path, base_out_path):
-    # defining archive
-    archive = CombineArchiveReader().run(in_file=omex_file_path, out_dir=tmp_dir,
-                                         try_reading_as_plain_zip_archive=True)
+@profiled('execSedDoc')
+def exec_sed_doc(omex_file_path, base_out_path, workers: int = 1, executor: str = 'process',
+                 h5_chunks: bool = True, h5_compression: str = 'gzip', h5_compression_level: int = 9,
+                 force: bool = False):
+    from biosimulators_utils.report.data_model import ReportResults
+    from vcell_cli_utils.manifest import OutputManifest
+    from vcell_cli_utils.reports import Hdf5ReportSession, read_vcell_csvs
+    from vcell_cli_utils.sedml_cache import sedml_summary
+
+    # defining archive, released (and cleaned up once unused) when done; one reports.h5 handle for every report.
+    # Reports whose CSV and SED-ML are unchanged since they were last written (see manifest.py) are skipped,
+    # unless `force`
+    with open_workspace(omex_file_path) as workspace, \
+            OutputManifest(base_out_path, force=force) as manifest, \
+            Hdf5ReportSession(base_out_path, chunks=h5_chunks, compression=h5_compression,
+                              compression_opts=h5_compression_level) as h5_writer:
+        # determine files to execute
+        sedml_contents = workspace.sedml_contents
+        h5_options = dict(chunks=h5_chunks, compression=h5_compression, compression_level=h5_compression_level)
+
+        report_filenames = {}
+        stale_reports = {}
+        for content in sedml_contents:
+            report_filenames[content.location] = glob.glob(os.path.join(base_out_path, content.location, '*.csv'))
+            for report_filename in report_filenames[content.location]:
+                report_id = os.path.splitext(os.path.basename(report_filename))[0]
+                rel_path = get_report_rel_path(content.location, report_id)
+                signature = manifest.signature([workspace.file_path(content.location), report_filename],
+                                               **h5_options)
+                if not (manifest.is_current('reports.h5:' + rel_path, signature) and h5_writer.contains(rel_path)):
+                    stale_reports[report_filename] = (rel_path, signature)
+
+        # CSVs are parsed by the pool (workers > 1), the HDF5 writes below stay serial and in order
+        parsed_reports = read_vcell_csvs([report_filename for filenames in report_filenames.values()
+                                          for report_filename in filenames if report_filename in stale_reports],
+                                         workers=workers, executor=executor)
+
+        report_results = ReportResults()
+        for i_content, content in enumerate(sedml_contents):
+            content_report_filenames = [report_filename for report_filename in report_filenames[content.location]
+                                        if report_filename in stale_reports]
+            if not content_report_filenames:
+                continue
+
+            content_filename = workspace.file_path(content.location)
+
+            # outputs and data sets only, parsed once per SED-ML content (see sedml_cache.py)
+            outputs = {output['id']: output for output in sedml_summary(content_filename)['outputs']}
+
+            for report_filename in content_report_filenames:
+                report_id = os.path.splitext(os.path.basename(report_filename))[0]
+                rel_path, signature = stale_reports[report_filename]
+
+                # read report from CSV file produced by VCell (parsed in advance by the pool, if any)
+                with stage('csv_parse', sedml=content.location, report=rel_path):
+                    data_set_arrays = next(parsed_reports)
+
+                report, data_set_results = get_sed_report_results(outputs[report_id], data_set_arrays)
 
-    # determine files to execute
-    sedml_contents = get_sedml_contents(archive)
+                # append to data structure of report results
+                report_results[report_id] = data_set_results
 
-    report_results = ReportResults()
-    for i_content, content in enumerate(sedml_contents):
-        content_filename = os.path.join(tmp_dir, content.location)
-
-        doc = SedmlSimulationReader().run(content_filename)
-
-        for report_filename in glob.glob(os.path.join(base_out_path, content.location, '*.csv')):
-            report_id = os.path.splitext(os.path.basename(report_filename))[0]
-
-            # read report from CSV file produced by VCell
-            data_set_df = pd.read_csv(report_filename).transpose()
-            data_set_df.columns = data_set_df.iloc[0]
-            data_set_df = data_set_df.drop(data_set_df.iloc[0].name)
-            data_set_df = data_set_df.reset_index()
-            data_set_df = data_set_df.rename(
-                columns={'index': data_set_df.columns.name})
-            data_set_df = data_set_df.transpose()
-            data_set_df.index.name = None
-
-            report = next(
-                report for report in doc.outputs if report.id == report_id)
-
-            data_set_results = DataSetResults()
-
-            # print("report: ", report, file=sys.stderr)
-            # print("report Type: ", type(report), file=sys.stderr)
-            # print("Plot Type: ", Plot2D, file=sys.stderr)
-            if type(report) != Plot2D and type(report) != Plot3D:
-                # Considering the scenario where it has the datasets in sedml
-                for data_set in report.data_sets:
-                    data_set_results[data_set.id] = data_set_df.loc[data_set.label, :].to_numpy(
-                        dtype='float64')
-                    # print("DF for report: ", data_set_results[data_set.id], file=sys.stderr)
-                    # print("df.types: ", data_set_results[data_set.id].dtype, file=sys.stderr)
-            else:
-                data_set_df = pd.read_csv(report_filename, header=None).T
-                data_set_df.columns = data_set_df.iloc[0]
-                data_set_df.drop(0, inplace=True)
-                data_set_df.reset_index(inplace=True)
-                data_set_df.drop('index', axis=1, inplace=True)
-                # print("DF for plot: ", data_set_df, file=sys.stderr)
-                # Considering the scenario where it doesn't have datasets in sedml (pseudo sedml for plots)
-                for col in list(data_set_df.columns):
-                    data_set_results[col] = data_set_df[col].values
-
-            # append to data structure of report results
-            report_results[report_id] = data_set_results
-
-            # save file in desired BioSimulators format(s)
-            # for report_format in report_formats:
-            # print("HDF report: ", report, file=sys.stderr)
-            # print("HDF dataset results: ", data_set_results, file=sys.stderr)
-            # print("HDF base_out_path: ", base_out_path,file=sys.stderr)
-            # print("HDF path: ", os.path.join(content.location, report.id), file=sys.stderr)
-
-            rel_path = os.path.join(content.location, report.id)
-
-            if len(rel_path.split("./")) > 1:
-                rel_path = rel_path.split("./")[1]
-
-            if type(report) != Plot2D and type(report) != Plot3D:
-                ReportWriter().run(report,
-                                   data_set_results,
-                                   base_out_path,
-                                   rel_path,
-                                   format='h5')
+                # save file in desired BioSimulators format(s)
+                # for report_format in report_formats:
+                # print("HDF report: ", report, file=sys.stderr)
+                # print("HDF dataset results: ", data_set_results, file=sys.stderr)
+                # print("HDF base_out_path: ", base_out_path,file=sys.stderr)
+                # print("HDF path: ", os.path.join(content.location, report.id), file=sys.stderr)
+
+                with stage('h5_write', sedml=content.location, report=rel_path):
+                    h5_writer.write(report, data_set_results, rel_path)
+                manifest.record('reports.h5:' + rel_path, signature)
+
+
+# Rough in-memory size of one parsed, transposed CSV value, to turn a memory budget into a block width
+TRANSPOSE_BYTES_PER_VALUE = 128
+# Rough in-memory size of one character of CSV text while it's split and parsed, to size the pieces a row is
+# read in
+TRANSPOSE_BYTES_PER_CHAR = 8
+
+
+class NonNumericCsvError(ValueError):
+    pass
+
+
+def read_csv_row_pieces(f, piece_chars: int):
+    # (starts a row?, tokens) of every piece of about `piece_chars` characters of the file's rows, cut at commas;
+    # blank lines are skipped like pandas does
+    import csv
+
+    carry = ''
+    new_row = True
+    while True:
+        text = f.readline(piece_chars)
+        if not text:
+            if carry:
+                yield new_row, next(csv.reader([carry]))
+            return
+        text = carry + text
+        if text.endswith('\n'):
+            carry = ''
+            if new_row and not text.strip():
+                continue
+            yield new_row, next(csv.reader([text]))
+            new_row = True
+            continue
+
+        cut = text.rfind(',')
+        if cut < 0:
+            carry = text
+            continue
+        text, carry = text[:cut], text[cut + 1:]
+        yield new_row, next(csv.reader([text]))
+        new_row = False
+
+
+def parse_csv_values(tokens: list):
+    # (float64 values, int64 column?) of tokens read as one CSV column by pandas, so the values (and whether
+    # pandas would keep them as integers) are the same as read_csv gives for the whole table
+    import io
+    import numpy as np
+    import pandas as pd
+
+    # a header line, so that leading empty tokens are read as missing values too
+    column = pd.read_csv(io.StringIO('v\n' + '\n'.join(tokens)), skip_blank_lines=False)['v']
+    if column.dtype.kind not in 'if':
+        raise NonNumericCsvError(column.dtype)
+    values = column.to_numpy(dtype=np.float64)
+    if len(values) < len(tokens):
+        # trailing empty tokens
+        values = np.concatenate([values, np.full(len(tokens) - len(values), np.nan)])
+    return values, column.dtype.kind == 'i' and len(values) == len(column)
+
+
+def parse_csv_labels(labels: list):
+    # (values, dtype kind) of the first column as read_csv parses it: strings ('O') for VCell's labels
+    import csv
+    import io
+    import pandas as pd
+
+    text = io.StringIO()
+    csv.writer(text, lineterminator='\n').writerows([['v']] + [[label] for label in labels])
+    text.seek(0)
+    column = pd.read_csv(text, skip_blank_lines=False)['v']
+    values = column.tolist() + [float('nan')] * (len(labels) - len(column))
+    return values, column.dtype.kind if len(column) == len(labels) else 'f'
+
+
+@profiled('transposeVcmlCsv')
+def transpose_vcml_csv(csv_file_path: str, max_memory_mb: float = None):
+    import pandas as pd
+
+    if max_memory_mb is None:
+        with stage('csv_transpose', csv=csv_file_path):
+            df = pd.read_csv(csv_file_path, header=None)
+            cols = list(df.columns)
+            final_cols = [col for col in cols if col != '']
+            df[final_cols].transpose().to_csv(csv_file_path, header=False, index=False)
+        return
+
+    try:
+        transpose_csv_two_pass(csv_file_path, max_memory_mb)
+    except NonNumericCsvError:
+        transpose_csv_column_blocks(csv_file_path, max_memory_mb)
+
+
+def transpose_csv_two_pass(csv_file_path: str, max_memory_mb: float):
+    # Bounded memory in two passes: every input row (one data set: label, values) is parsed once, a piece at a
+    # time, and its values appended to a temporary float64 file; then blocks of columns of that file, memory
+    # mapped, are written out as the output rows. Values are parsed by pandas and written as to_csv writes
+    # them, so the output is the same as transposing the whole table at once. NonNumericCsvError for values
+    # (past the first column) that aren't numbers.
+    import csv
+    import tempfile
+    import numpy as np
+    from vcell_cli_utils.status_store import open_atomic
+
+    budget = max_memory_mb * 2 ** 20
+    piece_chars = max(1 << 16, int(budget / TRANSPOSE_BYTES_PER_CHAR))
+    labels = []
+    row_lengths = []
+    # columns whose every value pandas would read as an integer
+    int_columns = np.ones(0, dtype=bool)
+
+    with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(csv_file_path))) as values_file:
+        with stage('csv_parse', csv=csv_file_path), open(csv_file_path) as f:
+            for new_row, tokens in read_csv_row_pieces(f, piece_chars):
+                if new_row:
+                    if row_lengths:
+                        int_columns[row_lengths[-1]:] = False
+                    labels.append(tokens[0])
+                    tokens = tokens[1:]
+                    row_lengths.append(0)
+                start = row_lengths[-1]
+                end = start + len(tokens)
+                if end > len(int_columns):
+                    # columns the rows before this one don't have
+                    int_columns = np.concatenate([int_columns, np.full(end - len(int_columns), len(labels) == 1)])
+
+                values, all_int = parse_csv_values(tokens)
+                if not all_int:
+                    for i_token in np.flatnonzero(int_columns[start:end]):
+                        int_columns[start + i_token] = tokens[i_token].strip().lstrip('+-').isdigit()
+                values.tofile(values_file)
+                row_lengths[-1] = end
+            if row_lengths:
+                int_columns[row_lengths[-1]:] = False
+        values_file.flush()
+
+        num_cols = max(row_lengths, default=0)
+        offsets = np.concatenate([[0], np.cumsum(row_lengths)])
+        values = np.memmap(values_file, dtype=np.float64, mode='r', shape=(offsets[-1],)) if offsets[-1] else None
+        block_cols = max(1, int(budget / (max(len(labels), 1) * TRANSPOSE_BYTES_PER_VALUE)))
+        with stage('csv_transpose', csv=csv_file_path, block_cols=block_cols), \
+                open_atomic(csv_file_path, newline='') as out:
+            writer = csv.writer(out, lineterminator=os.linesep)
+            label_values, label_kind = parse_csv_labels(labels) if labels else ([], 'O')
+            # to_csv of the transposed table: with the (string) labels every value keeps its column's type,
+            # without them integers only stay integers if every column is one
+            if label_kind == 'O':
+                writer.writerow(['' if value != value else value for value in label_values])
+            elif label_kind == 'i' and int_columns.all():
+                writer.writerow([str(value) for value in label_values])
             else:
-                datasets = []
-                for col in list(data_set_df.columns):
-                    datasets.append(DataSet(id=col, label=col, name=col))
-                report.data_sets = datasets
-                ReportWriter().run(report,
-                                   data_set_results,
-                                   base_out_path,
-                                   rel_path,
-                                   format='h5')
-
-    # Remove temp directory
-    shutil.rmtree(tmp_dir)
-
-
-def transpose_vcml_csv(csv_file_path: str):
-    df = pd.read_csv(csv_file_path, header=None)
-    cols = list(df.columns)
-    final_cols = [col for col in cols if col != '']
-    df[final_cols].transpose().to_csv(csv_file_path, header=False, index=False)
+                int_columns[:] = False
+                writer.writerow(['' if value != value else repr(float(value)) for value in label_values])
+            for start in range(0, num_cols, block_cols):
+                end = min(start + block_cols, num_cols)
+                block = np.full((len(labels), end - start), np.nan)
+                for i_row, (offset, length) in enumerate(zip(offsets, row_lengths)):
+                    if length > start:
+                        block[i_row, :min(length, end) - start] = values[offset + start:offset + min(length, end)]
+                for i_col, column in enumerate(block.T.tolist()):
+                    if int_columns[start + i_col]:
+                        writer.writerow([str(int(value)) for value in column])
+                    else:
+                        writer.writerow(['' if value != value else repr(value) for value in column])
+        del values
+
+
+def transpose_csv_column_blocks(csv_file_path: str, max_memory_mb: float):
+    # Bounded memory for tables that aren't numbers only: a first pass only measures the table, then every pass
+    # parses the next block of columns, which become the next block of output rows. pandas infers each column's
+    # type on its own, so the output is the same as transposing the whole table at once, but the whole file is
+    # read again for every block: about rows * columns * TRANSPOSE_BYTES_PER_VALUE / budget passes.
+    import csv
+    import pandas as pd
+    from vcell_cli_utils.status_store import open_atomic
+
+    num_rows = 0
+    num_cols = 0
+    with open(csv_file_path, newline='') as f:
+        for row in csv.reader(f):
+            if row:
+                num_rows += 1
+                num_cols = max(num_cols, len(row))
+
+    block_cols = max(1, int(max_memory_mb * 2 ** 20 / (max(num_rows, 1) * TRANSPOSE_BYTES_PER_VALUE)))
+    with stage('csv_transpose', csv=csv_file_path, block_cols=block_cols), \
+            open_atomic(csv_file_path, newline='') as f:
+        for start in range(0, num_cols, block_cols):
+            df = pd.read_csv(csv_file_path, header=None, usecols=range(start, min(start + block_cols, num_cols)))
+            df.transpose().to_csv(f, header=False, index=False)
 
 
 def get_all_dataref_and_curves(sedml_path):
+    from vcell_cli_utils.sedml_cache import sedml_summary
+
     all_plot_curves = {}
     all_report_dataref = {}
 
-    sedml = lsed.readSedML(sedml_path)
-
-    for output in sedml.getListOfOutputs():
-        if type(output) == SedPlot2D:
+    for output in sedml_summary(sedml_path)['outputs']:
+        if output['type'] == 'plot2D':
             all_curves = {}
-            for curve in output.getListOfCurves():
-                all_curves[curve.getId()] = {
-                    'x': curve.getXDataReference(),
-                    'y': curve.getYDataReference()
+            for curve in output['curves']:
+                all_curves[curve['id']] = {
+                    'x': curve['x'],
+                    'y': curve['y']
                 }
-            all_plot_curves[output.getId()] = all_curves
-        if type(output) == SedReport:
-            for dataset in output.getListOfDataSets():
-
-                ######
-                if output.getId() in all_report_dataref:
-
-                    all_report_dataref[output.getId()].append({
-                        'data_reference': dataset.getDataReference(),
-                        'data_label': dataset.getLabel()
-                    })
-                else:
-                    all_report_dataref[output.getId()] = []
-                    all_report_dataref[output.getId()].append({
-                        'data_reference': dataset.getDataReference(),
-                        'data_label': dataset.getLabel()
-                    })
+            all_plot_curves[output['id']] = all_curves
+        if output['type'] == 'report':
+            for dataset in output['data_sets']:
+                all_report_dataref.setdefault(output['id'], []).append({
+                    'data_reference': dataset['data_reference'],
+                    'data_label': dataset['label']
+                })
 
     return all_report_dataref, all_plot_curves
 
@@ -273,25 +487,54 @@ def get_report_label_from_data_ref(dataref: str, all_report_dataref):
                 return report, data_ref['data_label']
 
 
+class UnresolvedDataReferenceError(ValueError):
+    def __init__(self, unresolved: list):
+        # unresolved: [{'plot', 'curve', 'axis', 'data_reference'}, ...]
+        self.unresolved = unresolved
+        super().__init__("{} curve data reference(s) are not a data set of any report: {}".format(
+            len(unresolved), ', '.join('{plot}/{curve}.{axis} -> {data_reference}'.format(**ref) for ref in unresolved)))
+
+
+def build_dataref_index(all_report_dataref):
+    # data reference -> (report, label), first report wins like get_report_label_from_data_ref
+    index = {}
+    for report, data_refs in all_report_dataref.items():
+        for data_ref in data_refs:
+            index.setdefault(data_ref['data_reference'], (report, data_ref['data_label']))
+    return index
+
+
 # Update plots dict
 
 def update_dataref_with_report_label(all_report_dataref, all_plot_curves):
+    dataref_index = build_dataref_index(all_report_dataref)
 
+    unresolved = []
     for plot, curves in all_plot_curves.items():
         for curve_name, datarefs in curves.items():
+            resolved = {}
+            for axis in ('x', 'y'):
+                resolved[axis] = dataref_index.get(datarefs[axis])
+                if resolved[axis] is None:
+                    unresolved.append({'plot': plot, 'curve': curve_name, 'axis': axis,
+                                       'data_reference': datarefs[axis]})
+            if resolved['x'] is None or resolved['y'] is None:
+                continue
+
             new_ref = dict(datarefs)
-            new_ref['x'] = get_report_label_from_data_ref(
-                datarefs['x'], all_report_dataref)[1]
-            new_ref['y'] = get_report_label_from_data_ref(
-                datarefs['y'], all_report_dataref)[1]
-            new_ref['report'] = get_report_label_from_data_ref(
-                datarefs['y'], all_report_dataref)[0]
+            new_ref['x'] = resolved['x'][1]
+            new_ref['y'] = resolved['y'][1]
+            new_ref['report'] = resolved['y'][0]
             curves[curve_name] = new_ref
 
+    if unresolved:
+        raise UnresolvedDataReferenceError(unresolved)
+
     return all_report_dataref, all_plot_curves
 
 
 def get_report_dataframes(all_report_dataref, result_out_dir):
+    import pandas as pd
     report_frames = {}
     reports_list = list(set(all_report_dataref.keys()))
     for report in reports_list:
@@ -304,76 +547,153 @@ def get_report_dataframes(all_report_dataref, result_out_dir):
 # PLOTTING
 
 
-def plot_and_save_curves(all_plot_curves, report_frames, result_out_dir):
+def plot_and_save_curves(all_plot_curves, report_frames, result_out_dir, workers: int = 1, decimate: str = None,
+                         engine: str = None):
+    from vcell_cli_utils.plots import render_plots
+    from vcell_cli_utils.reports import ReportFrameCache
+
+    # a dict of report frames (get_report_dataframes) still works
+    if isinstance(report_frames, dict):
+        report_frames = ReportFrameCache(result_out_dir, frames=report_frames)
+
     all_plots = dict(all_plot_curves)
+    plot_jobs = []
     for plot, curve_dat in all_plots.items():
-        dims = (12, 8)
-        fig, ax = plt.subplots(figsize=dims)
+        curves = []
         for curve, data in curve_dat.items():
-            df = report_frames[data['report']]
-            df.to_csv(os.path.join(result_out_dir, plot + '.csv'),
-                      index=False, header=True)
-            transpose_vcml_csv(os.path.join(result_out_dir, plot + '.csv'))
-            sns.lineplot(x=df[data['x']].astype(
-                np.float64), y=df[data['y']].astype(np.float64), ax=ax, label=curve)
-            ax.set_ylabel('')
-        #         plt.show()
-        plt.savefig(os.path.join(result_out_dir, plot + '.pdf'), dpi=300)
-
-
-def gen_plot_pdfs(sedml_path, result_out_dir):
+            curves.append((curve, data['x'], report_frames.column(data['report'], data['x']),
+                           report_frames.column(data['report'], data['y'])))
+        if curve_dat:
+            # written once per plot, from the report of its last curve as before
+            with stage('csv_write', plot=plot):
+                report_frames.write_plot_csv(data['report'], os.path.join(result_out_dir, plot + '.csv'))
+        plot_jobs.append((os.path.join(result_out_dir, plot + '.pdf'), curves))
+
+    # every plot is rendered once, spread over `workers` processes
+    render_plots(plot_jobs, workers=workers, decimate=decimate, engine=engine)
+
+
+@profiled('genPlotPdfs')
+def gen_plot_pdfs(sedml_path, result_out_dir, workers: int = 1, force: bool = False, reports_h5: str = None,
+                  plots: list = None, decimate: str = None, engine: str = None):
+    # reports_h5: read the curves from this reports.h5 (written by execSedDoc) instead of the report CSVs;
+    # plots: only these plot ids; decimate / engine: see plots.py
+    from vcell_cli_utils.manifest import OutputManifest
+    from vcell_cli_utils.plots import render_options
+    from vcell_cli_utils.reports import ReportFrameCache
+
     all_report_dataref, all_plot_curves = get_all_dataref_and_curves(
         sedml_path)
+    if plots is not None:
+        plots = set(plots)
+        all_plot_curves = {plot: curves for plot, curves in all_plot_curves.items() if plot in plots}
     all_report_dataref, all_plot_curves = update_dataref_with_report_label(
         all_report_dataref, all_plot_curves)
-    report_frames = get_report_dataframes(all_report_dataref, result_out_dir)
-    plot_and_save_curves(all_plot_curves, report_frames, result_out_dir)
 
+    # the signatures execSedDoc recorded for the reports in reports.h5, rather than hashing all of reports.h5
+    report_signatures = {}
+    if reports_h5:
+        location = get_h5_location(reports_h5, result_out_dir)
+        h5_outputs = OutputManifest(os.path.dirname(os.path.abspath(reports_h5))).outputs
+        for curves in all_plot_curves.values():
+            for data in curves.values():
+                report_signatures[data['report']] = h5_outputs.get(
+                    'reports.h5:' + get_report_rel_path(location, data['report']))
+
+    # plots drawn differently than by default are signed with their options
+    options = {key: value for key, value in render_options(decimate, engine).items()
+               if value not in (None, 'seaborn')}
+
+    # only plots whose SED-ML or report data changed since they were last rendered (see manifest.py), unless `force`
+    with OutputManifest(result_out_dir, force=force) as manifest:
+        stale_plot_curves = {}
+        signatures = {}
+        for plot, curves in all_plot_curves.items():
+            reports = sorted({data['report'] for data in curves.values()})
+            if reports_h5 and all(report_signatures[report] for report in reports):
+                signature = manifest.signature([sedml_path], source='h5', reports={
+                    report: report_signatures[report] for report in reports}, **options)
+            elif reports_h5:
+                signature = manifest.signature([sedml_path, reports_h5], source='h5', **options)
+            else:
+                signature = manifest.signature(
+                    [sedml_path] + [os.path.join(result_out_dir, report + '.csv') for report in reports], **options)
+            plot_paths = [os.path.join(result_out_dir, plot + '.pdf')]
+            if curves:
+                plot_paths.append(os.path.join(result_out_dir, plot + '.csv'))
+            if not manifest.is_current(plot + '.pdf', signature, plot_paths):
+                stale_plot_curves[plot] = curves
+                signatures[plot] = signature
+
+        if reports_h5:
+            with open_report_columns(reports_h5, result_out_dir) as report_columns:
+                plot_and_save_curves(stale_plot_curves, report_columns, result_out_dir, workers=workers,
+                                     decimate=decimate, engine=engine)
+        else:
+            plot_and_save_curves(stale_plot_curves, ReportFrameCache(result_out_dir), result_out_dir, workers=workers,
+                                 decimate=decimate, engine=engine)
+        for plot, signature in signatures.items():
+            manifest.record(plot + '.pdf', signature)
+
+
+@profiled('genPlotsPseudoSedml')
+def gen_plots_for_sed2d_only(sedml_path, result_out_dir, workers: int = 1, reports_h5: str = None,
+                             decimate: str = None, engine: str = None):
+    # reports_h5: read the curves from this reports.h5 (written by execPlotOutputSedDoc) instead of <plot>.csv;
+    # decimate / engine: see plots.py
+    from vcell_cli_utils.plots import render_plots
+    from vcell_cli_utils.reports import read_vcell_csv
+    from vcell_cli_utils.sedml_cache import sedml_summary
 
-def gen_plots_for_sed2d_only(sedml_path, result_out_dir):
     all_plot_curves = {}
-    all_report_dataref = {}
 
-    sedml = lsed.readSedML(sedml_path)
-    # print(sedml)
-
-    for output in sedml.getListOfOutputs():
-        # print(output)
-        if type(output) == SedPlot2D:
+    for output in sedml_summary(sedml_path)['outputs']:
+        if output['type'] == 'plot2D':
             all_curves = {}
-            for curve in output.getListOfCurves():
-                # print(curve)
-                all_curves[curve.getId()] = {
-                    'x': curve.getXDataReference(),
-                    'y': curve.getYDataReference()
+            for curve in output['curves']:
+                all_curves[curve['id']] = {
+                    'x': curve['x'],
+                    'y': curve['y']
                 }
-            all_plot_curves[output.getId()] = all_curves
+            all_plot_curves[output['id']] = all_curves
 
     all_plots = dict(all_plot_curves)
-    for plot, curve_dat in all_plots.items():
-        dims = (12, 8)
-        fig, ax = plt.subplots(figsize=dims)
-        for curve, data in curve_dat.items():
-            df = pd.read_csv(os.path.join(
-                result_out_dir, plot + '.csv'), header=None).T
-            df.columns = df.iloc[0]
-            df.drop(0, inplace=True)
-            df.reset_index(inplace=True)
-            df.drop('index', axis=1, inplace=True)
-
-            sns.lineplot(x=df[data['x']].astype(
-                np.float), y=df[data['y']].astype(np.float), ax=ax, label=curve)
-            ax.set_ylabel('')
-            #             plt.show()
-            plt.savefig(os.path.join(result_out_dir, plot + '.pdf'), dpi=300)
+    plot_jobs = []
+    report_columns = open_report_columns(reports_h5, result_out_dir) if reports_h5 else None
+    try:
+        for plot, curve_dat in all_plots.items():
+            curves = []
+            if report_columns is not None:
+                # only the rows of the plot's data sets the curves use
+                for curve, data in curve_dat.items():
+                    curves.append((curve, data['x'], report_columns.column(plot, data['x']),
+                                   report_columns.column(plot, data['y'])))
+            else:
+                # <plot>.csv is read once for all of its curves
+                with stage('csv_parse', plot=plot):
+                    data_sets = read_vcell_csv(os.path.join(result_out_dir, plot + '.csv'))
+                for curve, data in curve_dat.items():
+                    curves.append((curve, data['x'], data_sets[data['x']], data_sets[data['y']]))
+            plot_jobs.append((os.path.join(result_out_dir, plot + '.pdf'), curves))
+    finally:
+        if report_columns is not None:
+            report_columns.close()
+
+    # every plot is rendered once (not once per curve), spread over `workers` processes
+    render_plots(plot_jobs, workers=workers, decimate=decimate, engine=engine)
+
+
+# Command table shared by the Fire CLI and the server
+commands = {
+    'genSedml2d3d': gen_sedml_2d_3d,
+    'execPlotOutputSedDoc': exec_plot_output_sed_doc,
+    'genPlotsPseudoSedml': gen_plots_for_sed2d_only,
+    'execSedDoc': exec_sed_doc,
+    'transposeVcmlCsv': transpose_vcml_csv,
+    'genPlotPdfs': gen_plot_pdfs,
+}
 
 
 if __name__ == "__main__":
-    fire.Fire({
-        'genSedml2d3d': gen_sedml_2d_3d,
-        'execPlotOutputSedDoc': exec_plot_output_sed_doc,
-        'genPlotsPseudoSedml': gen_plots_for_sed2d_only,
-        'execSedDoc': exec_sed_doc,
-        'transposeVcmlCsv': transpose_vcml_csv,
-        'genPlotPdfs': gen_plot_pdfs,
-    })
+    import fire
+    fire.Fire(commands)
@@ -0,0 +1,117 @@
+import ast
+import json
+import os
+import socket
+import sys
+
+# Thin forwarder for a running `python -m vcell_cli_utils.server`. Only stdlib imports on purpose,
+# so the launcher swap `python cli.py <command> ...` -> `python client.py <command> ...` is cheap.
+SOCKET_ENV = 'VCELL_CLI_UTILS_SOCKET'
+PORT_ENV = 'VCELL_CLI_UTILS_PORT'
+
+# Parameters of a command read from stdin when '-' (the default): (name, position). The server's stdin isn't the
+# caller's, the client sends the lines of its own stdin as a list instead.
+STDIN_PARAMS = {
+    'updateStatusBatch': ('updates', 1),
+}
+
+
+def parse_value(value: str):
+    # Like Fire: Python literals (numbers, True / False, None, lists, ...) are parsed, anything else is a string
+    try:
+        root = ast.parse(value, mode='eval')
+        if isinstance(root.body, ast.BinOp):
+            return value
+        return ast.literal_eval(root)
+    except (SyntaxError, ValueError):
+        return value
+
+
+def parse_argv(argv: list):
+    # Fire style arguments: positionals plus --key=value / --key value flags. --noX is sent as is, the server
+    # turns it into X=False when the command has an X parameter.
+    args = []
+    kwargs = {}
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg.startswith('--'):
+            key = arg[2:]
+            if '=' in key:
+                key, value = key.split('=', 1)
+                value = parse_value(value)
+            elif i + 1 < len(argv) and not argv[i + 1].startswith('--'):
+                i += 1
+                value = parse_value(argv[i])
+            else:
+                value = True
+            kwargs[key.replace('-', '_')] = value
+        else:
+            args.append(parse_value(arg))
+        i += 1
+    return args, kwargs
+
+
+def read_stdin_params(command: str, args: list, kwargs: dict):
+    if command not in STDIN_PARAMS:
+        return
+    name, position = STDIN_PARAMS[command]
+    if name in kwargs:
+        if kwargs[name] == '-':
+            kwargs[name] = sys.stdin.read().splitlines()
+    elif len(args) > position:
+        if args[position] == '-':
+            args[position] = sys.stdin.read().splitlines()
+    else:
+        kwargs[name] = sys.stdin.read().splitlines()
+
+
+def connect(socket_path: str = None, port: int = None):
+    socket_path = socket_path or os.environ.get(SOCKET_ENV)
+    port = port or os.environ.get(PORT_ENV)
+
+    if socket_path:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(socket_path)
+    elif port:
+        sock = socket.create_connection(('127.0.0.1', int(port)))
+    else:
+        raise RuntimeError("Set {} or {} to the address of the running server".format(SOCKET_ENV, PORT_ENV))
+    return sock
+
+
+def call(command: str, *args, socket_path: str = None, port: int = None, **kwargs):
+    # Relative paths are resolved against the caller's working directory, not the server's
+    request = {'id': 1, 'method': command, 'params': {'args': list(args), 'kwargs': kwargs, 'cwd': os.getcwd()}}
+    with connect(socket_path=socket_path, port=port) as sock:
+        sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        with sock.makefile('r', encoding='utf-8') as reader:
+            line = reader.readline()
+    if not line:
+        raise ConnectionError("Server closed the connection without a response")
+    return json.loads(line)
+
+
+def main(argv: list = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("Usage: client.py <command> [args...]", file=sys.stderr)
+        return 2
+
+    args, kwargs = parse_argv(argv[1:])
+    read_stdin_params(argv[0], args, kwargs)
+    response = call(argv[0], *args, **kwargs)
+
+    if 'error' in response:
+        error = response['error']
+        print(error.get('traceback') or "{}: {}".format(error['type'], error['message']), file=sys.stderr)
+        return 1
+
+    result = response.get('result')
+    if result is not None:
+        print(result if isinstance(result, str) else json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import json
+import os
+
+from vcell_cli_utils._version import __version__
+from vcell_cli_utils.status_store import write_atomic
+from vcell_cli_utils.workspace import archive_digest
+
+MANIFEST_FILE_NAME = '.vcell_cli_utils_manifest.json'
+
+
+class OutputManifest:
+    # Input signatures (content hashes of input files, options, tool version) of the outputs generated into
+    # one directory, so a re-run only regenerates outputs whose inputs changed. Outputs are keyed by name,
+    # e.g. 'reports.h5:<location>/<report id>' or '<plot id>.pdf'.
+    def __init__(self, out_dir: str, force: bool = False):
+        self.path = os.path.join(out_dir, MANIFEST_FILE_NAME)
+        self.force = force
+        self.outputs = {}
+        self._changed = False
+
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path) as f:
+                    doc = json.load(f)
+            except ValueError:
+                doc = {}
+            # a different tool version may write different outputs, so its signatures don't count
+            if isinstance(doc, dict) and doc.get('version') == __version__:
+                self.outputs = doc.get('outputs', {})
+
+    @staticmethod
+    def signature(input_paths: list, **options):
+        return {
+            'inputs': [archive_digest(path) for path in input_paths],
+            'options': options,
+        }
+
+    def is_current(self, output: str, signature: dict, output_paths: list = ()):
+        # unchanged inputs, and the output is still there
+        return (not self.force
+                and self.outputs.get(output) == signature
+                and all(os.path.exists(path) for path in output_paths))
+
+    def record(self, output: str, signature: dict):
+        self.outputs[output] = signature
+        self._changed = True
+
+    def save(self):
+        if not self._changed:
+            return
+        out_dir = os.path.dirname(self.path)
+        if not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+        write_atomic(self.path, json.dumps({'version': __version__, 'outputs': self.outputs},
+                                           indent=1, sort_keys=True))
+        self._changed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # outputs recorded before a failure are complete, keep them
+        self.save()
@@ -0,0 +1,144 @@
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg')  # headless, also in pool workers
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import seaborn as sns  # noqa: E402
+
+from vcell_cli_utils.profiling import stage  # noqa: E402
+
+PLOT_SIZE = (12, 8)
+PLOT_DPI = 300
+# Curves are decimated to about this many buckets, one per pixel column of the figure at PLOT_DPI
+PLOT_BUCKETS = PLOT_SIZE[0] * PLOT_DPI
+
+# Defaults of the plotting commands' `decimate` (None, 'minmax' or 'lttb') and `engine` ('seaborn' or
+# 'matplotlib', a plain line without seaborn's sorting and estimator) options
+default_decimate = os.environ.get('VCELL_PLOT_DECIMATE') or None
+default_engine = os.environ.get('VCELL_PLOT_ENGINE') or 'seaborn'
+
+
+def _buckets_of(x, buckets: int):
+    # bucket of every point: equal x widths (pixel columns) for time courses, equal point counts otherwise
+    n = len(x)
+    if n > 1 and x[-1] > x[0] and np.all(x[1:] >= x[:-1]):
+        return np.minimum(((x - x[0]) * (buckets / (x[-1] - x[0]))).astype(np.int64), buckets - 1)
+    return np.arange(n, dtype=np.int64) * buckets // n
+
+
+def decimate_minmax(x, y, buckets: int = PLOT_BUCKETS):
+    # First, last, lowest and highest point of every bucket, in curve order: at one bucket per pixel column the
+    # line looks the same, with at most 4 points per column
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= 4 * buckets or not (np.all(np.isfinite(x)) and np.all(np.isfinite(y))):
+        return x, y
+
+    bucket = _buckets_of(x, buckets)
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:] - 1, n - 1]
+    # bucket number (0, 1, ...) of every point, then the first point of each bucket equal to its min / max
+    ordinal = np.repeat(np.arange(len(starts)), ends - starts + 1)
+    extremes = []
+    for reduce in (np.minimum, np.maximum):
+        hits = np.flatnonzero(y == reduce.reduceat(y, starts)[ordinal])
+        extremes.append(hits[np.r_[True, ordinal[hits[1:]] != ordinal[hits[:-1]]]])
+
+    keep = np.unique(np.concatenate([starts, ends] + extremes))
+    return x[keep], y[keep]
+
+
+def decimate_lttb(x, y, threshold: int = PLOT_BUCKETS):
+    # Largest-Triangle-Three-Buckets: `threshold` points, the one of each bucket spanning the largest triangle
+    # with the point kept before it and the mean of the next bucket. Buckets are chosen one after the other,
+    # the points of a bucket in one vectorized step.
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= threshold or threshold < 3 or not (np.all(np.isfinite(x)) and np.all(np.isfinite(y))):
+        return x, y
+
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    sizes = np.diff(edges)
+    mean_x = np.add.reduceat(x[:n - 1], edges[:-1]) / sizes
+    mean_y = np.add.reduceat(y[:n - 1], edges[:-1]) / sizes
+    # the bucket after the last one is the last point
+    mean_x = np.r_[mean_x[1:], x[-1]]
+    mean_y = np.r_[mean_y[1:], y[-1]]
+
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    a = 0
+    for i_bucket in range(threshold - 2):
+        start, end = edges[i_bucket], edges[i_bucket + 1]
+        area = np.abs((x[a] - mean_x[i_bucket]) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (mean_y[i_bucket] - y[a]))
+        a = keep[i_bucket + 1] = start + int(np.argmax(area))
+    return x[keep], y[keep]
+
+
+DECIMATORS = {
+    'minmax': decimate_minmax,
+    'lttb': decimate_lttb,
+}
+
+
+def render_options(decimate: str = None, engine: str = None):
+    # the effective options: the defaults when not given, decimate='none' to turn a default decimation off
+    decimate = default_decimate if decimate is None else decimate
+    if not decimate or decimate == 'none':
+        decimate = None
+    elif decimate not in DECIMATORS:
+        raise ValueError("Unknown decimation `{}`, expected one of {}".format(decimate, ', '.join(DECIMATORS)))
+    engine = engine or default_engine
+    if engine not in ('seaborn', 'matplotlib'):
+        raise ValueError("Unknown plot engine `{}`, expected seaborn or matplotlib".format(engine))
+    return {'decimate': decimate, 'engine': engine}
+
+
+def render_plot(pdf_path: str, curves: list, decimate: str = None, engine: str = None):
+    # curves: [(curve label, x label, x values, y values), ...]; drawn and saved exactly once
+    options = render_options(decimate, engine)
+    decimate, engine = options['decimate'], options['engine']
+
+    fig, ax = plt.subplots(figsize=PLOT_SIZE)
+    try:
+        for label, x_label, x, y in curves:
+            if decimate:
+                x, y = DECIMATORS[decimate](x, y)
+            if engine == 'matplotlib':
+                ax.plot(x, y, label=label)
+            else:
+                sns.lineplot(x=x, y=y, ax=ax, label=label)
+            ax.set_xlabel(x_label)
+            ax.set_ylabel('')
+        if engine == 'matplotlib' and curves:
+            ax.legend()
+        fig.savefig(pdf_path, dpi=PLOT_DPI)
+    finally:
+        plt.close(fig)
+    return pdf_path
+
+
+def _render_plot_job(job, **options):
+    return render_plot(*job, **options)
+
+
+def render_plots(plot_jobs: list, workers: int = 1, decimate: str = None, engine: str = None):
+    # plot_jobs: [(pdf_path, curves), ...]; one plot per task when spread over a process pool
+    if workers <= 1 or len(plot_jobs) <= 1:
+        pdf_paths = []
+        for job in plot_jobs:
+            with stage('plot_render', plot=os.path.basename(job[0])):
+                pdf_paths.append(render_plot(*job, decimate=decimate, engine=engine))
+        return pdf_paths
+
+    with stage('plot_render', plots=len(plot_jobs), workers=workers), \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(functools.partial(_render_plot_job, decimate=decimate, engine=engine), plot_jobs))
@@ -0,0 +1,110 @@
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# JSON lines profile, one line per command with its wall / CPU time, peak RSS and stages; off when unset
+profile_path = os.environ.get('VCELL_PROFILE') or None
+# Directory for one cProfile dump (.prof, see pstats / snakeviz) per command; off when unset
+cprofile_dir = os.environ.get('VCELL_CPROFILE') or None
+
+_local = threading.local()
+
+
+def peak_rss_kb():
+    # Peak resident set size of this process so far (the OS only tracks the high-water mark)
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+@contextmanager
+def stage(name: str, **labels):
+    # Times one stage (archive extraction, SED-ML parsing, CSV parsing, HDF5 writing, PDF rendering...) of
+    # the profiled command running in this thread; labels say which SED document / report it was for.
+    # Stages run in pool workers are not seen, their wait shows up in the caller's stage instead.
+    stages = getattr(_local, 'stages', None)
+    if stages is None:
+        yield
+        return
+
+    start_rss = peak_rss_kb()
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    try:
+        yield
+    finally:
+        record = {'stage': name}
+        record.update(labels)
+        record['wall'] = round(time.perf_counter() - start_wall, 6)
+        record['cpu'] = round(time.process_time() - start_cpu, 6)
+        record['peak_rss_kb'] = peak_rss_kb()
+        if start_rss is not None:
+            record['peak_rss_growth_kb'] = record['peak_rss_kb'] - start_rss
+        stages.append(record)
+
+
+def write_profile(path: str, record: dict):
+    # one line per command; a single O_APPEND write, so concurrent commands don't interleave
+    line = json.dumps(record) + '\n'
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+    try:
+        os.write(fd, line.encode('utf-8'))
+    finally:
+        os.close(fd)
+
+
+def profiled(command: str):
+    # Records the decorated command (and the stages it runs) when VCELL_PROFILE / VCELL_CPROFILE are set.
+    # A command called by another profiled command is part of the outer one's record.
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if (profile_path is None and cprofile_dir is None) or getattr(_local, 'stages', None) is not None:
+                return func(*args, **kwargs)
+
+            _local.stages = []
+            profiler = cProfile.Profile() if cprofile_dir else None
+            started = time.time()
+            start_wall = time.perf_counter()
+            start_cpu = time.process_time()
+            status = 'SUCCEEDED'
+            try:
+                if profiler is not None:
+                    profiler.enable()
+                return func(*args, **kwargs)
+            except BaseException:
+                status = 'FAILED'
+                raise
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                    if not os.path.isdir(cprofile_dir):
+                        os.makedirs(cprofile_dir)
+                    profiler.dump_stats(os.path.join(cprofile_dir, '{}-{}-{}.prof'.format(
+                        command, os.getpid(), int(started * 1000))))
+
+                record = {
+                    'command': command,
+                    'args': [str(arg) for arg in args],
+                    'kwargs': {key: str(value) for key, value in kwargs.items()},
+                    'pid': os.getpid(),
+                    'started': round(started, 3),
+                    'status': status,
+                    'wall': round(time.perf_counter() - start_wall, 6),
+                    'cpu': round(time.process_time() - start_cpu, 6),
+                    'peak_rss_kb': peak_rss_kb(),
+                    'stages': _local.stages,
+                }
+                _local.stages = None
+                if profile_path is not None:
+                    write_profile(profile_path, record)
+        return wrapper
+    return decorator
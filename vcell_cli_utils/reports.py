@@ -0,0 +1,268 @@
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from vcell_cli_utils.profiling import stage
+
+
+def read_vcell_csv(csv_file_path: str):
+    # VCell writes one row per data set: label, value_0, value_1, ...
+    # Returns {label: float64 array} in file order, short rows padded with NaN like pandas does
+    labels = []
+    rows = []
+    with open(csv_file_path, newline='') as f:
+        for row in csv.reader(f):
+            if not row:
+                continue
+            labels.append(row[0])
+            rows.append(row[1:])
+
+    num_values = max((len(values) for values in rows), default=0)
+    data_sets = {}
+    for label, values in zip(labels, rows):
+        data = np.full(num_values, np.nan)
+        try:
+            data[:len(values)] = np.array(values, dtype=np.float64)
+        except ValueError:
+            # empty cells
+            data[:len(values)] = [float(value) if value.strip() else np.nan for value in values]
+        data_sets[label] = data
+    return data_sets
+
+
+def read_vcell_csvs(csv_file_paths: list, workers: int = 1, executor: str = 'process'):
+    # Parsed reports in input order, so the caller's (single) HDF5 writer produces the same file as a serial run
+    if workers <= 1 or len(csv_file_paths) <= 1:
+        for csv_file_path in csv_file_paths:
+            yield read_vcell_csv(csv_file_path)
+        return
+
+    pool_class = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+    with pool_class(max_workers=workers) as pool:
+        yield from pool.map(read_vcell_csv, csv_file_paths)
+
+
+class Hdf5ReportSession:
+    # Keeps reports.h5 open across all reports of an archive instead of one ReportWriter().run() open/close
+    # per report. Data sets and attributes are laid out exactly like ReportWriter's, so ReportReader reads them.
+    def __init__(self, base_path: str, chunks=True, compression: str = 'gzip', compression_opts: int = 9):
+        self.base_path = base_path
+        # chunks=False: contiguous (h5py wants None for that)
+        self.chunks = chunks if chunks else None
+        self.compression = compression or None
+        self.compression_opts = compression_opts if self.compression else None
+        self._file = None
+
+    @property
+    def file(self):
+        # Opened on the first write, so archives without reports still don't get a reports.h5
+        if self._file is None:
+            import h5py
+            from biosimulators_utils.config import get_config
+
+            if not os.path.isdir(self.base_path):
+                os.makedirs(self.base_path)
+            self._file = h5py.File(os.path.join(self.base_path, get_config().H5_REPORTS_PATH), 'a')
+        return self._file
+
+    def contains(self, rel_path: str):
+        # without creating reports.h5 when there is none yet
+        if self._file is None:
+            from biosimulators_utils.config import get_config
+
+            if not os.path.isfile(os.path.join(self.base_path, get_config().H5_REPORTS_PATH)):
+                return False
+        return rel_path in self.file
+
+    def write(self, report, results, rel_path: str, type=None):
+        from biosimulators_utils.report.io import Hdf5DataSetType
+        from biosimulators_utils.sedml.data_model import Report
+        from biosimulators_utils.utils.core import pad_arrays_to_consistent_shapes
+
+        results_array = []
+        data_set_ids = []
+        data_set_labels = []
+        data_set_names = []
+        data_set_data_types = []
+        data_set_shapes = []
+        for data_set in report.data_sets:
+            if data_set.id in results:
+                data_set_result = results[data_set.id]
+                results_array.append(data_set_result)
+                data_set_ids.append(data_set.id)
+                data_set_labels.append(data_set.label)
+                data_set_names.append(data_set.name or '')
+                if data_set_result is None:
+                    data_set_data_types.append('__None__')
+                    data_set_shapes.append('')
+                else:
+                    data_set_data_types.append(data_set_result.dtype.name)
+                    data_set_shapes.append(','.join(str(dim_len) for dim_len in data_set_result.shape))
+        results_array = np.array(pad_arrays_to_consistent_shapes(results_array))
+
+        if rel_path in self.file:
+            del self.file[rel_path]
+
+        data_set = self.file.create_dataset(rel_path, data=results_array, chunks=self.chunks,
+                                            compression=self.compression, compression_opts=self.compression_opts)
+        data_set.attrs['_type'] = Hdf5DataSetType(type or Report).name
+        if report.id:
+            data_set.attrs['uri'] = rel_path
+            data_set.attrs['sedmlId'] = report.id
+        if report.name:
+            data_set.attrs['sedmlName'] = report.name
+        data_set.attrs['sedmlDataSetIds'] = data_set_ids
+        data_set.attrs['sedmlDataSetNames'] = data_set_names
+        data_set.attrs['sedmlDataSetLabels'] = data_set_labels
+        data_set.attrs['sedmlDataSetDataTypes'] = data_set_data_types
+        data_set.attrs['sedmlDataSetShapes'] = data_set_shapes
+
+        group_ids = rel_path.split(os.path.sep)[0:-1]
+        for i_group in range(len(group_ids)):
+            uri = '/'.join(group_ids[0:i_group + 1])
+            group = self.file[uri]
+            group.attrs['uri'] = uri
+            group.attrs['combineArchiveLocation'] = uri
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ReportFrameCache:
+    # Report CSVs of one genPlotPdfs run, each read once however many plots and curves use it. Columns are
+    # converted to float64 once, and the transposed (VCell row layout) plot CSV text is rendered once per report.
+    def __init__(self, result_out_dir: str, frames: dict = None):
+        self.result_out_dir = result_out_dir
+        self._frames = dict(frames or {})
+        self._columns = {}
+        self._plot_csv_texts = {}
+
+    def frame(self, report: str):
+        # one row per time point, one column per data set label, like get_report_dataframes
+        if report not in self._frames:
+            import pandas as pd
+
+            with stage('csv_parse', report=report):
+                frame = pd.read_csv(os.path.join(self.result_out_dir, report + '.csv')).T.reset_index()
+                frame.columns = frame.iloc[0].values
+                frame.drop(index=0, inplace=True)
+            self._frames[report] = frame
+        return self._frames[report]
+
+    def column(self, report: str, label: str):
+        key = (report, label)
+        if key not in self._columns:
+            self._columns[key] = self.frame(report)[label].to_numpy(dtype=np.float64)
+        return self._columns[key]
+
+    def plot_csv_text(self, report: str):
+        # same bytes as writing the frame to CSV and running transposeVcmlCsv on it
+        if report not in self._plot_csv_texts:
+            self._plot_csv_texts[report] = self.frame(report).T.to_csv(header=False)
+        return self._plot_csv_texts[report]
+
+    def write_plot_csv(self, report: str, csv_file_path: str):
+        with open(csv_file_path, 'w', newline='') as f:
+            f.write(self.plot_csv_text(report))
+
+
+class Hdf5ReportColumns:
+    # Same interface as ReportFrameCache, reading the reports execSedDoc / execPlotOutputSedDoc wrote to
+    # reports.h5 instead of re-parsing their CSVs: only the rows (data sets) the curves use are read, each
+    # cut back to its original length. Uncompressed contiguous data sets are memory-mapped, others are read
+    # through h5py, which only decompresses the chunks a row spans.
+    def __init__(self, h5_path: str, location: str):
+        self.h5_path = h5_path
+        self.location = location
+        self._file = None
+        self._reports = {}
+        self._columns = {}
+        self._plot_csv_paths = {}
+
+    @property
+    def file(self):
+        if self._file is None:
+            import h5py
+
+            self._file = h5py.File(self.h5_path, 'r')
+        return self._file
+
+    def report(self, report: str):
+        # (h5py data set, memory map or None, {label: row}, row lengths)
+        if report not in self._reports:
+            rel_path = os.path.join(self.location, report) if self.location not in ('', '.') else report
+            if rel_path not in self.file:
+                raise KeyError("Report `{}` is not in {}".format(rel_path, self.h5_path))
+            data_set = self.file[rel_path]
+
+            rows = {}
+            for i_row, label in enumerate(data_set.attrs['sedmlDataSetLabels']):
+                rows.setdefault(str(label), i_row)
+            lengths = [int(shape.split(',')[0]) if shape else 0 for shape in data_set.attrs['sedmlDataSetShapes']]
+
+            memory_map = None
+            offset = data_set.id.get_offset()
+            if data_set.chunks is None and data_set.compression is None and offset is not None \
+                    and data_set.dtype.kind == 'f':
+                memory_map = np.memmap(self.h5_path, dtype=data_set.dtype, mode='r', offset=offset,
+                                       shape=data_set.shape)
+            self._reports[report] = (data_set, memory_map, rows, lengths)
+        return self._reports[report]
+
+    def row(self, report: str, i_row: int):
+        data_set, memory_map, rows, lengths = self.report(report)
+        if memory_map is not None:
+            values = memory_map[i_row, :lengths[i_row]]
+        else:
+            values = data_set[i_row, :lengths[i_row]]
+        return np.array(values, dtype=np.float64)
+
+    def column(self, report: str, label: str):
+        key = (report, label)
+        if key not in self._columns:
+            rows = self.report(report)[2]
+            if label not in rows:
+                raise KeyError("Data set `{}` is not in report `{}`".format(label, report))
+            with stage('h5_read', report=report, label=label):
+                self._columns[key] = self.row(report, rows[label])
+        return self._columns[key]
+
+    def write_plot_csv(self, report: str, csv_file_path: str):
+        # VCell row layout (label, values...), the same values as the CSV route (floats written as Python's
+        # shortest repr); streamed one row at a time, and written once per report then copied
+        import shutil
+
+        written = self._plot_csv_paths.get(report)
+        if written is not None and os.path.isfile(written):
+            if os.path.abspath(written) != os.path.abspath(csv_file_path):
+                shutil.copyfile(written, csv_file_path)
+            return
+
+        data_set = self.report(report)[0]
+        with open(csv_file_path, 'w', newline='') as f:
+            writer = csv.writer(f, lineterminator=os.linesep)
+            for i_row, label in enumerate(data_set.attrs['sedmlDataSetLabels']):
+                writer.writerow([str(label)] + self.row(report, i_row).tolist())
+        self._plot_csv_paths[report] = csv_file_path
+
+    def close(self):
+        self._reports = {}
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
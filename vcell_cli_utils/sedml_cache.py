@@ -0,0 +1,117 @@
+import copy
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from vcell_cli_utils.profiling import stage
+from vcell_cli_utils.status_store import write_atomic
+from vcell_cli_utils.workspace import archive_digest
+
+# Directory of parsed SED-ML summaries (<content sha256>.json) shared by the commands of a pipeline,
+# each running in its own process; off when unset
+cache_dir = os.environ.get('VCELL_SEDML_CACHE_DIR') or None
+# Parsed documents kept in memory per process (server / batch mode)
+max_cached_documents = int(os.environ.get('VCELL_SEDML_CACHE_SIZE', 16))
+
+# Bump when the summary layout changes, older files on disk are then ignored
+SUMMARY_FORMAT = 1
+
+_summaries = OrderedDict()
+_documents = OrderedDict()
+_lock = threading.RLock()
+
+
+def summarize_sedml(sedml_path: str):
+    # What the commands need from a SED-ML document, as plain JSON-able data in document order:
+    # {'tasks': [id, ...], 'outputs': [{'id', 'name', 'type' (SED-ML element name, e.g. report / plot2D),
+    #   'data_sets': [{'id', 'name', 'label', 'data_reference'}, ...], 'curves': [{'id', 'x', 'y'}, ...]}, ...]}
+    import libsedml
+
+    with stage('sedml_parse', sedml=sedml_path):
+        sedml_doc = libsedml.readSedMLFromFile(sedml_path)
+
+    outputs = []
+    for output in sedml_doc.getListOfOutputs():
+        summary = {
+            'id': output.getId(),
+            'name': output.getName(),
+            'type': output.getElementName(),
+            'data_sets': [],
+            'curves': [],
+        }
+        if type(output) == libsedml.SedReport:
+            for data_set in output.getListOfDataSets():
+                summary['data_sets'].append({
+                    'id': data_set.getId(),
+                    'name': data_set.getName(),
+                    'label': data_set.getLabel(),
+                    'data_reference': data_set.getDataReference(),
+                })
+        elif type(output) == libsedml.SedPlot2D:
+            for curve in output.getListOfCurves():
+                summary['curves'].append({
+                    'id': curve.getId(),
+                    'x': curve.getXDataReference(),
+                    'y': curve.getYDataReference(),
+                })
+        outputs.append(summary)
+
+    return {
+        'tasks': [task.getId() for task in sedml_doc.getListOfTasks()],
+        'outputs': outputs,
+    }
+
+
+def _remember(cache: OrderedDict, key, value):
+    with _lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_cached_documents:
+            cache.popitem(last=False)
+
+
+def sedml_summary(sedml_path: str):
+    # summarize_sedml() parsed once per content: from memory, else from cache_dir, else libsedml.
+    # Shared between callers, don't modify it.
+    digest = archive_digest(sedml_path)
+    key = (os.path.abspath(sedml_path), digest)
+    with _lock:
+        summary = _summaries.get(key)
+    if summary is not None:
+        return summary
+
+    cache_path = os.path.join(cache_dir, digest + '.json') if cache_dir else None
+    if cache_path and os.path.isfile(cache_path):
+        try:
+            with open(cache_path) as f:
+                cached = json.load(f)
+            if cached.get('format') == SUMMARY_FORMAT:
+                summary = cached['summary']
+        except (ValueError, KeyError, AttributeError):
+            summary = None
+
+    if summary is None:
+        summary = summarize_sedml(sedml_path)
+        if cache_path:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir, exist_ok=True)
+            write_atomic(cache_path, json.dumps({'format': SUMMARY_FORMAT, 'summary': summary}))
+
+    _remember(_summaries, key, summary)
+    return summary
+
+
+def read_sed_doc(sedml_path: str):
+    # biosimulators_utils SedDocument, read and validated once per content and path (model sources are
+    # relative to it). Callers get their own copy and may modify it.
+    from biosimulators_utils.sedml.io import SedmlSimulationReader
+
+    key = (os.path.abspath(sedml_path), archive_digest(sedml_path))
+    with _lock:
+        doc = _documents.get(key)
+    if doc is None:
+        with stage('sedml_parse', sedml=sedml_path):
+            doc = SedmlSimulationReader().run(sedml_path)
+        _remember(_documents, key, doc)
+    return copy.deepcopy(doc)
@@ -0,0 +1,218 @@
+import contextlib
+import inspect
+import json
+import multiprocessing
+import os
+import socketserver
+import sys
+import traceback
+
+from vcell_cli_utils import cli, status, status_store
+from vcell_cli_utils.client import STDIN_PARAMS
+from vcell_cli_utils.workspace import forked_child_cleanup
+
+# Same command names as the cli.py / status.py Fire entry points
+commands = {}
+commands.update(cli.commands)
+commands.update(status.commands)
+
+
+def preload():
+    # The commands import their dependencies lazily, load them all once so no request pays for it
+    import libsedml  # noqa: F401
+    import pandas  # noqa: F401
+    import biosimulators_utils.combine.io  # noqa: F401
+    import biosimulators_utils.sedml.io  # noqa: F401
+    import biosimulators_utils.report.io  # noqa: F401
+    import vcell_cli_utils.plots  # noqa: F401
+    import vcell_cli_utils.reports  # noqa: F401
+
+
+def fire_kwargs(func, kwargs: dict):
+    # Fire's --noX flag (X=False) for a command with an X parameter, as the client forwards it unresolved
+    parameters = inspect.signature(func).parameters
+    resolved = {}
+    for key, value in kwargs.items():
+        if key not in parameters and key.startswith('no') and key[2:] in parameters and value is True:
+            key, value = key[2:], False
+        resolved[key] = value
+    return resolved
+
+
+def check_stdin_params(method: str, func, args: list, kwargs: dict):
+    # '-' would read the server's stdin (the transport, or /dev/null in a forked child), not the caller's
+    if method not in STDIN_PARAMS:
+        return
+    name = STDIN_PARAMS[method][0]
+    bound = inspect.signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+    if bound.arguments.get(name) == '-':
+        raise ValueError("{} reads `{}` from stdin, which the server can't: send its lines as a list (client.py "
+                         "does that with its own stdin)".format(method, name))
+
+
+def dispatch(request: dict):
+    method = request.get('method')
+    params = request.get('params') or {}
+    response = {'id': request.get('id')}
+
+    if method not in commands:
+        response['error'] = {'type': 'KeyError', 'message': "Unknown command: {}".format(method)}
+        return response
+
+    if isinstance(params, list):
+        args, kwargs, cwd = params, {}, None
+    else:
+        args, kwargs, cwd = params.get('args', []), params.get('kwargs', {}), params.get('cwd')
+
+    previous_cwd = os.getcwd()
+    try:
+        if cwd is not None:
+            # relative paths of the request are the client's
+            os.chdir(cwd)
+        # stdout may be the transport, keep command chatter off of it
+        kwargs = fire_kwargs(commands[method], kwargs)
+        check_stdin_params(method, commands[method], args, kwargs)
+        with contextlib.redirect_stdout(sys.stderr):
+            response['result'] = commands[method](*args, **kwargs)
+    except Exception as e:
+        response['error'] = {
+            'type': type(e).__name__,
+            'message': str(e),
+            'traceback': traceback.format_exc(),
+        }
+    finally:
+        os.chdir(previous_cwd)
+    return response
+
+
+def _dispatch_in_child(request: dict, conn):
+    try:
+        with forked_child_cleanup():
+            conn.send(dispatch(request))
+    finally:
+        conn.close()
+
+
+def dispatch_isolated(request: dict):
+    # Forked child keeps the warm imports but can't take the server down (e.g. native crashes)
+    ctx = multiprocessing.get_context('fork')
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_dispatch_in_child, args=(request, child_conn))
+    proc.start()
+    child_conn.close()
+    try:
+        response = parent_conn.recv()
+    except EOFError:
+        response = None
+    proc.join()
+
+    if response is None:
+        response = {
+            'id': request.get('id'),
+            'error': {
+                'type': 'ChildProcessError',
+                'message': "Command {} exited with code {}".format(request.get('method'), proc.exitcode),
+            },
+        }
+    return response
+
+
+def handle_line(line: str, isolate: bool = True):
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        return {'id': None, 'error': {'type': 'ValueError', 'message': "Invalid request: {}".format(e)}}
+    if not isinstance(request, dict):
+        return {'id': None, 'error': {'type': 'ValueError', 'message': "Request must be a JSON object"}}
+
+    # None tells the transport to stop serving
+    if request.get('method') == 'shutdown':
+        return None
+
+    if isolate:
+        return dispatch_isolated(request)
+    return dispatch(request)
+
+
+def encode_response(response: dict):
+    return json.dumps(response, default=str) + '\n'
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for raw_line in self.rfile:
+            line = raw_line.decode('utf-8').strip()
+            if not line:
+                continue
+            response = handle_line(line, isolate=self.server.isolate)
+            if response is None:
+                self.wfile.write(encode_response({'id': None, 'result': None}).encode('utf-8'))
+                self.server.shutdown_requested = True
+                return
+            self.wfile.write(encode_response(response).encode('utf-8'))
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.UnixStreamServer):
+    isolate = True
+    shutdown_requested = False
+
+
+class _TCPServer(socketserver.TCPServer):
+    allow_reuse_address = True
+    isolate = True
+    shutdown_requested = False
+
+
+def serve_stdio(isolate: bool = True):
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        response = handle_line(line, isolate=isolate)
+        if response is None:
+            break
+        sys.stdout.write(encode_response(response))
+        sys.stdout.flush()
+
+
+def serve(socket_path: str = None, port: int = None, isolate: bool = True, status_flush_interval: float = None):
+    # Every request runs in its own forked child by default: nothing it caches (workspaces, status stores, SED-ML
+    # summaries, pyplot state) outlives it. --noisolate runs requests in the server process itself, faster
+    # for many small requests but a crash or a leak then affects every later request.
+    preload()
+    if status_flush_interval is not None:
+        # Debounce status.yml writes across requests (--noisolate), pending updates are flushed at exit or by
+        # flushStatus. An isolated request's store is flushed when its child exits: only the writes of a single
+        # request are debounced.
+        status_store.default_flush_interval = float(status_flush_interval)
+        if isolate:
+            print("--status_flush_interval debounces status.yml writes across requests only with --noisolate, "
+                  "here within each request", file=sys.stderr)
+
+    if socket_path is None and port is None:
+        serve_stdio(isolate=isolate)
+        return
+
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _UnixServer(socket_path, _RequestHandler)
+    else:
+        server = _TCPServer(('127.0.0.1', int(port)), _RequestHandler)
+    server.isolate = isolate
+
+    try:
+        while not server.shutdown_requested:
+            server.handle_request()
+    finally:
+        server.server_close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    import fire
+    fire.Fire(serve)
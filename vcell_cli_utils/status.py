@@ -1,180 +1,160 @@
-import os
-from os.path import basename
-import fire
-from biosimulators_utils.archive.io import ArchiveReader
-import libsedml
-import yaml
-import tempfile
-import zipfile
-import shutil
-
-
-# Create temp directory
-tmp_dir = tempfile.mkdtemp()
-
-def extract_omex_archive(omex_file):
-    if not os.path.isfile(omex_file):
-        raise FileNotFoundError("File does not exist: {}".format(omex_file))
-
-    if not zipfile.is_zipfile(omex_file):
-        raise IOError("File is not an OMEX Combine Archive in zip format: {}".format(omex_file))
-
-    archive_reader = ArchiveReader()
-    omex_metadata_tuple = archive_reader.run(omex_file, tmp_dir).to_tuple()
-
-    sedml_files_list = list()
-    for sed in omex_metadata_tuple[0]:
-        if sed[1].endswith(".sedml"):
-            sedml_files_list.append(sed[1])
-
-    return sedml_files_list
+import json
+import sys
+from vcell_cli_utils.profiling import profiled, stage
+from vcell_cli_utils.status_store import QUEUED, SUCCEEDED, dump_yaml, get_store, load_yaml
+from vcell_cli_utils.workspace import open_workspace
 
 
+@profiled('genStatusYaml')
 def status_yml(omex_file: str, out_dir: str):
-    yaml_dict = {}
-
-    for sedml in extract_omex_archive(omex_file):
-        outputs_dict = {"outputs": {}}
-        tasks_dict = {"tasks": {}}
-        # add temp dir path
-        sedml_path = os.path.join(tmp_dir, sedml)
-        sedml_doc = libsedml.readSedMLFromFile(sedml_path)
-
-        # Get all the required metadata
-        tasks = sedml_doc.getListOfTasks()
-        plots = sedml_doc.getListOfOutputs()
-
-        # Convert into the list
-        task_list = [task.getId() for task in tasks]
-
-        plots_dict = {}
-        reports_dict = {}
-        other_list = []
-
-        for plot in plots:
-            if type(plot) == libsedml.SedPlot2D:
-                plots_dict[plot.getId()] = [curve.getId() for curve in plot.getListOfCurves()]
-            elif type(plot) == libsedml.SedReport:
-                reports_dict[plot.getId()] = [dataSet.getId() for dataSet in plot.getListOfDataSets()]
-            else:
-                other_list.append(plot.getId())
-
-        for plot in list(plots_dict.keys()):
-            curves_dict = {}
-            for curve in plots_dict[plot]:
-                curves_dict[curve] = 'SUCCEEDED'
-            outputs_dict["outputs"].update({plot: {"curves": curves_dict}})
-            outputs_dict["outputs"][plot].update({"status": "SUCCEEDED"})
-
-        for report in list(reports_dict.keys()):
-            dataset_dict = {}
-            for dataset in reports_dict[report]:
-                dataset_dict[dataset] = 'QUEUED'
-            outputs_dict["outputs"].update({report: {"dataSets": dataset_dict}})
-            outputs_dict["outputs"][report].update({"status": "QUEUED"})
-
-        for task in task_list:
-            tasks_dict["tasks"].update({task: {"status": "QUEUED"}})
-
-        sed_doc_dict = {sedml: {}}
-        sed_doc_dict[sedml].update(outputs_dict)
-        sed_doc_dict[sedml].update(tasks_dict)
-        sed_doc_dict[sedml].update({"status": "QUEUED"})
-        yaml_dict[sedml] = sed_doc_dict[sedml]
-    final_dict = {}
-    final_dict['sedDocuments'] = dict(yaml_dict)
-    final_dict['status'] = "QUEUED"
-
-    status_yaml_path = os.path.join(out_dir, "status.yml")
-
-    with open(status_yaml_path, 'w' , encoding="utf-8") as sy:
-        sy.write(yaml.dump(final_dict))
+    # only this command parses SED-ML, the update commands stay yaml-only
+    from vcell_cli_utils.sedml_cache import sedml_summary
+
+    # The status tree is built in one pass, straight into the document the store writes
+    sed_documents = {}
+
+    with open_workspace(omex_file) as workspace:
+        for sedml in workspace.sedml_files:
+            # add temp dir path
+            sedml_path = workspace.file_path(sedml)
+            sedml_doc = sedml_summary(sedml_path)
+
+            outputs = {}
+            for output in sedml_doc['outputs']:
+                if output['type'] == 'plot2D':
+                    outputs[output['id']] = {
+                        'curves': {curve['id']: SUCCEEDED for curve in output['curves']},
+                        'status': SUCCEEDED,
+                    }
+                elif output['type'] == 'report':
+                    outputs[output['id']] = {
+                        'dataSets': {data_set['id']: QUEUED for data_set in output['data_sets']},
+                        'status': QUEUED,
+                    }
+
+            sed_documents[sedml] = {
+                'outputs': outputs,
+                'tasks': {task: {'status': QUEUED} for task in sedml_doc['tasks']},
+                'status': QUEUED,
+            }
+    final_dict = {'sedDocuments': sed_documents, 'status': QUEUED}
+
+    # Seed the in-memory store, updates in the same process skip re-reading the file
+    store = get_store(out_dir)
+    store.reset(final_dict)
+    with stage('status_write'):
+        store.flush()
     # return final_dict
-    shutil.rmtree(tmp_dir)
 
 def get_yaml_as_str(yaml_path: str):
-    # Import yaml
-    yaml_str = ''
-    with open(yaml_path, 'r') as sy:
-        yaml_str = sy.read()
-
     # Convert yaml to json
-    yaml_dict = yaml.load(yaml_str, yaml.SafeLoader)
-
-    return yaml_dict
+    return load_yaml(yaml_path)
 
 def dump_yaml_dict(yaml_path: str, yaml_dict: str):
-    with open(yaml_path, 'w' , encoding="utf-8") as sy:
-        sy.write(yaml.dump(yaml_dict))
+    dump_yaml(yaml_path, yaml_dict)
 
 
 def update_status(sedml: str, task: str, status: str, out_dir: str):
-
-    # Hardcoded because name is static
-    yaml_dict = get_yaml_as_str(os.path.join(out_dir, "status.yml"))
-
-    sedml_name_nested = [i for i in list(yaml_dict['sedDocuments'].keys()) if sedml.endswith(i)][0]
-
-    # Update task status
-    yaml_dict['sedDocuments'][sedml_name_nested]['tasks'][task]['status'] = status
-
-    # update individual SED-ML status
-    for key in yaml_dict['sedDocuments'][sedml_name_nested]['tasks'].keys():
-        if yaml_dict['sedDocuments'][sedml_name_nested]['tasks'][key]['status'] == 'QUEUED' or yaml_dict['sedDocuments'][sedml_name_nested]['tasks'][key]['status']== 'SUCCEEDED':
-            yaml_dict['sedDocuments'][sedml_name_nested]['status'] = 'SUCCEEDED'
-        else:
-            yaml_dict['sedDocuments'][sedml_name_nested]['status'] = 'FAILED'
-
-    status_yaml_path = os.path.join(out_dir, "status.yml")
-
-    # Convert json to yaml # Save new yaml
-    dump_yaml_dict(status_yaml_path, yaml_dict=yaml_dict)
+    get_store(out_dir).set_task_status(sedml, task, status)
 
 
 def update_dataset_status(sedml: str, report: str, dataset: str, status: str, out_dir: str):
-    yaml_dict = get_yaml_as_str(os.path.join(out_dir, "status.yml"))
-    sedml_name_nested = [i for i in list(yaml_dict['sedDocuments'].keys()) if sedml.endswith(i)][0]
-    # Update task status
-    try:
-        yaml_dict['sedDocuments'][sedml_name_nested]['outputs'][report]['dataSets'][dataset] = status
-    except KeyError:
-        pass
-
-    # update individual dataSets status
-    for key in yaml_dict['sedDocuments'][sedml_name_nested]['outputs'].keys():
-        try:
-            for dataset_key in yaml_dict['sedDocuments'][sedml_name_nested]['outputs'][key]['dataSets'].keys():
-                if yaml_dict['sedDocuments'][sedml_name_nested]['outputs'][key]['dataSets'][dataset_key] == 'QUEUED' or yaml_dict['sedDocuments'][sedml_name_nested]['outputs'][key]['dataSets'][dataset_key] == 'SUCCEEDED':
-                    yaml_dict['sedDocuments'][sedml_name_nested]['outputs'][key]['status'] = 'SUCCEEDED'
-                else:
-                    yaml_dict['sedDocuments'][sedml_name_nested]['outputs'][key]['status'] = 'FAILED'
-        except KeyError:
-            continue
-
-
-    status_yaml_path = os.path.join(out_dir, "status.yml")
-
-    # Convert json to yaml # Save new yaml
-    dump_yaml_dict(status_yaml_path, yaml_dict=yaml_dict)
+    get_store(out_dir).set_dataset_status(sedml, report, dataset, status)
 
 
 def sim_status(status: str, out_dir: str):
-
-    yaml_dict = get_yaml_as_str(os.path.join(out_dir, "status.yml"))
-
-    # Update simulation status
-    yaml_dict['status'] = status
-
-    status_yaml_path = os.path.join(out_dir, "status.yml")
-
-    # Convert json to yaml # Save new yaml
-    dump_yaml_dict(status_yaml_path, yaml_dict=yaml_dict)
+    get_store(out_dir).set_sim_status(status)
+
+
+def get_status(out_dir: str, sedml: str = None, output: str = None):
+    store = get_store(out_dir)
+    status = store.aggregate_status(sedml=sedml, output=output)
+    if output is not None:
+        counts = store.output_counts(sedml, output)
+    elif sedml is not None:
+        counts = store.task_counts(sedml)
+    else:
+        counts = {}
+        for sed_doc in store.document_names():
+            for task_status, count in store.task_counts(sed_doc).items():
+                counts[task_status] = counts.get(task_status, 0) + count
+    return {'status': status, 'counts': counts}
+
+
+# Keys of the three kinds of status update: a task, a data set, the simulation
+STATUS_UPDATE_KEYS = (
+    frozenset(('sedml', 'task', 'status')),
+    frozenset(('sedml', 'report', 'dataset', 'status')),
+    frozenset(('status',)),
+)
+
+
+def read_status_updates(updates='-'):
+    # JSON lines from a file, stdin ('-') or a list of lines (what client.py sends of its stdin), parsed up front
+    # so a malformed line changes nothing
+    if isinstance(updates, (list, tuple)):
+        stream = updates
+    else:
+        stream = sys.stdin if updates == '-' else open(updates, 'r', encoding="utf-8")
+    try:
+        status_updates = []
+        for line_num, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                update = json.loads(line)
+            except ValueError as e:
+                raise ValueError("Invalid status update on line {}: {}".format(line_num, e))
+            if not isinstance(update, dict) or frozenset(update) not in STATUS_UPDATE_KEYS:
+                raise ValueError("Invalid status update on line {}: expected the keys sedml, task, status or "
+                                 "sedml, report, dataset, status or status, got {}".format(line_num, line))
+            if not all(isinstance(value, str) for value in update.values()):
+                raise ValueError("Invalid status update on line {}: values must be strings, got {}".format(
+                    line_num, line))
+            status_updates.append(update)
+        return status_updates
+    finally:
+        if hasattr(stream, 'close') and stream is not sys.stdin:
+            stream.close()
+
+
+def apply_status_update(store, update: dict):
+    # {"sedml", "task", "status"} | {"sedml", "report", "dataset", "status"} | {"status"}
+    if 'task' in update:
+        store.set_task_status(update['sedml'], update['task'], update['status'])
+    elif 'dataset' in update:
+        store.set_dataset_status(update['sedml'], update['report'], update['dataset'], update['status'])
+    else:
+        store.set_sim_status(update['status'])
+
+
+def update_status_batch(out_dir: str, updates='-'):
+    status_updates = read_status_updates(updates)
+    store = get_store(out_dir)
+    with store.batch():
+        for update in status_updates:
+            apply_status_update(store, update)
+
+
+def flush_status(out_dir: str):
+    # Writes status.yml: pending changes of a debounced store (VCELL_STATUS_FLUSH_INTERVAL > 0), or the
+    # export of a sqlite store (VCELL_STATUS_STORE=sqlite)
+    get_store(out_dir).flush()
+
+
+# Command table shared by the Fire CLI and the server
+commands = {
+    'genStatusYaml': status_yml,
+    'updateTaskStatus': update_status,
+    'simStatus': sim_status,
+    'updateDataSetStatus': update_dataset_status,
+    'updateStatusBatch': update_status_batch,
+    'getStatus': get_status,
+    'flushStatus': flush_status,
+}
 
 
 if __name__ == "__main__":
-    fire.Fire({
-        'genStatusYaml': status_yml,
-        'updateTaskStatus': update_status,
-        'simStatus': sim_status,
-        'updateDataSetStatus': update_dataset_status,
-    })
+    import fire
+    fire.Fire(commands)
@@ -0,0 +1,355 @@
+import os
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from vcell_cli_utils.status_store import (FAILED, QUEUED, RUNNING, SKIPPED, STATUS_FILE_NAME, SUCCEEDED,
+                                          dump_yaml, load_yaml, record_durations, rollup_status, track_duration)
+
+STATUS_DB_FILE_NAME = "status.sqlite"
+
+# Integer codes of the statuses; any other status string gets the next free code when first used
+STATUS_CODES = {QUEUED: 0, RUNNING: 1, SUCCEEDED: 2, SKIPPED: 3, FAILED: 4}
+
+SCHEMA = """
+DROP TABLE IF EXISTS statuses;
+DROP TABLE IF EXISTS meta;
+DROP TABLE IF EXISTS documents;
+DROP TABLE IF EXISTS tasks;
+DROP TABLE IF EXISTS outputs;
+DROP TABLE IF EXISTS items;
+CREATE TABLE statuses (code INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value);
+CREATE TABLE documents (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, status INTEGER);
+CREATE TABLE tasks (document INTEGER NOT NULL, name TEXT NOT NULL, status INTEGER NOT NULL,
+                    start_time REAL, duration REAL, PRIMARY KEY (document, name)) WITHOUT ROWID;
+CREATE TABLE outputs (id INTEGER PRIMARY KEY, document INTEGER NOT NULL, name TEXT NOT NULL, kind TEXT NOT NULL,
+                      status INTEGER, UNIQUE (document, name));
+CREATE TABLE items (output INTEGER NOT NULL, name TEXT NOT NULL, status INTEGER NOT NULL,
+                    PRIMARY KEY (output, name)) WITHOUT ROWID;
+"""
+
+
+# Connections a forked child inherited from its parent's stores: never used nor closed in the child
+_inherited_connections = []
+
+
+def connect(db_path: str, create: bool = False):
+    # mode=rw fails on a missing file instead of creating an empty database
+    return sqlite3.connect('file:{}?mode={}'.format(quote(db_path), 'rwc' if create else 'rw'), uri=True,
+                           timeout=60, check_same_thread=False)
+
+
+def _tables_exist(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'documents'").fetchone() \
+        is not None
+
+
+def has_schema(db_path: str):
+    # a status.sqlite with its tables, not an empty file left by a failed open
+    if not os.path.isfile(db_path):
+        return False
+    try:
+        conn = connect(db_path)
+    except sqlite3.Error:
+        return False
+    try:
+        return _tables_exist(conn)
+    except sqlite3.DatabaseError:
+        return False
+    finally:
+        conn.close()
+
+
+class SqliteStatusStore:
+    # Same interface as StatusStore, backed by a status.sqlite sidecar: statuses are integer codes, every
+    # update is an in-place row write plus an indexed COUNT for the rollup, and nothing is parsed to read.
+    # status.yml is exported by flush() (genStatusYaml, flushStatus) and once the simulation has finished.
+    # Without a status.sqlite (status.yml written by the YAML store), the tables are seeded from status.yml.
+    def __init__(self, out_dir: str, durations: bool = None):
+        self.path = os.path.join(out_dir, STATUS_FILE_NAME)
+        self.db_path = os.path.join(out_dir, STATUS_DB_FILE_NAME)
+        self.durations = record_durations if durations is None else durations
+        self._conn = None
+        self._pid = None
+        self._codes = None
+        self._names = None
+        self._sed_doc_names = {}
+        self._dirty = False
+        self._export_pending = False
+        self._batch_depth = 0
+        self._lock = threading.RLock()
+
+    def _connect(self):
+        self._conn = connect(self.db_path, create=True)
+        self._pid = os.getpid()
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+
+    @property
+    def conn(self):
+        if self._conn is None or self._pid != os.getpid():
+            with self._lock:
+                if self._conn is None or self._pid != os.getpid():
+                    self.close()
+                    self.load()
+                    if not has_schema(self.db_path):
+                        self._seed()
+                    else:
+                        self._connect()
+        return self._conn
+
+    def _seed(self):
+        # status.yml first: no status.yml either raises here, before a database file is created
+        doc = load_yaml(self.path)
+        self._connect()
+        try:
+            with self._transaction():
+                # another process may have seeded it meanwhile
+                if not _tables_exist(self._conn):
+                    self._create(doc)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if self._conn is not None:
+            if self._pid == os.getpid():
+                self._conn.close()
+            else:
+                _inherited_connections.append(self._conn)
+            self._conn = None
+
+    def __del__(self):
+        # Without it the connection lives on until the cycle collector frees it (the sqlite3 module's statement
+        # cache refers back to it). A process must have no open connection when it forks: the children's own
+        # connections would share its SQLite lock state, and concurrent updates got lost.
+        self.close()
+
+    def load(self):
+        with self._lock:
+            self._codes = None
+            self._sed_doc_names = {}
+
+    def is_stale(self):
+        return False
+
+    def _code(self, status: str):
+        if self._codes is None:
+            self._codes = dict(self.conn.execute('SELECT name, code FROM statuses'))
+            self._names = {code: name for name, code in self._codes.items()}
+        code = self._codes.get(status)
+        if code is None:
+            code = self.conn.execute('SELECT COALESCE(MAX(code), -1) + 1 FROM statuses').fetchone()[0]
+            self.conn.execute('INSERT INTO statuses (code, name) VALUES (?, ?)', (code, status))
+            self._codes[status] = code
+            self._names[code] = status
+        return code
+
+    def _name(self, code):
+        if code is None:
+            return None
+        if self._names is None or code not in self._names:
+            self._codes = None
+            self._code(QUEUED)
+        return self._names[code]
+
+    def reset(self, doc: dict):
+        with self._lock:
+            if self._conn is None or self._pid != os.getpid():
+                self.close()
+                self._connect()
+            with self._transaction():
+                self._create(doc)
+
+    def _create(self, doc: dict):
+        for statement in SCHEMA.split(';'):
+            if statement.strip():
+                self.conn.execute(statement)
+        self._codes = None
+        self._sed_doc_names = {}
+        self.conn.executemany('INSERT INTO statuses (code, name) VALUES (?, ?)',
+                              [(code, name) for name, code in STATUS_CODES.items()])
+        for key in ('status', 'startTime', 'duration'):
+            if key in doc:
+                value = self._code(doc[key]) if key == 'status' and doc[key] is not None else doc[key]
+                self.conn.execute('INSERT INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+        for name, sed_doc in doc.get('sedDocuments', {}).items():
+            doc_id = self.conn.execute('INSERT INTO documents (name, status) VALUES (?, ?)', (
+                name, self._code(sed_doc['status']) if sed_doc.get('status') else None)).lastrowid
+            self.conn.executemany(
+                'INSERT INTO tasks (document, name, status, start_time, duration) VALUES (?, ?, ?, ?, ?)',
+                [(doc_id, task, self._code(task_dict['status']), task_dict.get('startTime'),
+                  task_dict.get('duration'))
+                 for task, task_dict in sed_doc.get('tasks', {}).items()])
+            for output_id, output in sed_doc.get('outputs', {}).items():
+                kind = 'dataSets' if 'dataSets' in output else 'curves'
+                row_id = self.conn.execute(
+                    'INSERT INTO outputs (document, name, kind, status) VALUES (?, ?, ?, ?)', (
+                        doc_id, output_id, kind, self._code(output['status']) if output.get('status') else None
+                    )).lastrowid
+                self.conn.executemany('INSERT INTO items (output, name, status) VALUES (?, ?, ?)',
+                                      [(row_id, item, self._code(item_status))
+                                       for item, item_status in output.get(kind, {}).items()])
+
+    @contextmanager
+    def _transaction(self):
+        # One transaction per update, or per batch() block. IMMEDIATE takes the database's write lock up
+        # front, so concurrent updates queue up (busy timeout) instead of failing on a stale read
+        if self._batch_depth > 0:
+            yield
+            return
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            # status codes added by the rolled back updates are gone, nor is there anything to export
+            self.load()
+            self._export_pending = False
+            raise
+
+    def sed_doc_name(self, sedml: str):
+        name = self._sed_doc_names.get(sedml)
+        if name is None:
+            name = self._sed_doc_names[sedml] = [i for i in self.document_names() if sedml.endswith(i)][0]
+        return name
+
+    def document_names(self):
+        return [name for name, in self.conn.execute('SELECT name FROM documents ORDER BY id')]
+
+    def _document_id(self, sedml: str):
+        return self.conn.execute('SELECT id FROM documents WHERE name = ?', (self.sed_doc_name(sedml),)).fetchone()[0]
+
+    def _counts(self, table: str, column: str, row_id: int):
+        return Counter({self._name(code): count for code, count in self.conn.execute(
+            'SELECT status, COUNT(*) FROM {} WHERE {} = ? GROUP BY status'.format(table, column), (row_id,))})
+
+    def set_task_status(self, sedml: str, task: str, status: str):
+        with self._lock, self._transaction():
+            doc_id = self._document_id(sedml)
+            row = self.conn.execute('SELECT start_time, duration FROM tasks WHERE document = ? AND name = ?',
+                                    (doc_id, task)).fetchone()
+            if row is None:
+                raise KeyError(task)
+
+            # Update task status and the SED-ML rollup
+            timing = {key: value for key, value in zip(('startTime', 'duration'), row) if value is not None}
+            if self.durations:
+                track_duration(timing, status)
+            self.conn.execute('UPDATE tasks SET status = ?, start_time = ?, duration = ? '
+                              'WHERE document = ? AND name = ?',
+                              (self._code(status), timing.get('startTime'), timing.get('duration'), doc_id, task))
+            rollup = rollup_status(self._counts('tasks', 'document', doc_id))
+            self.conn.execute('UPDATE documents SET status = ? WHERE id = ?',
+                              (self._code(rollup) if rollup else None, doc_id))
+
+    def set_dataset_status(self, sedml: str, report: str, dataset: str, status: str):
+        with self._lock, self._transaction():
+            row = self.conn.execute("SELECT id FROM outputs WHERE document = ? AND name = ? AND kind = 'dataSets'",
+                                    (self._document_id(sedml), report)).fetchone()
+            if row is None:
+                return
+
+            # Update (or add) data set status and the report rollup
+            output_row_id = row[0]
+            self.conn.execute('INSERT OR REPLACE INTO items (output, name, status) VALUES (?, ?, ?)',
+                              (output_row_id, dataset, self._code(status)))
+            rollup = rollup_status(self._counts('items', 'output', output_row_id))
+            self.conn.execute('UPDATE outputs SET status = ? WHERE id = ?',
+                              (self._code(rollup) if rollup else None, output_row_id))
+
+    def set_sim_status(self, status: str):
+        with self._lock:
+            with self._transaction():
+                timing = dict(self.conn.execute("SELECT key, value FROM meta WHERE key IN ('startTime', 'duration')"))
+                if self.durations:
+                    track_duration(timing, status)
+                self.conn.execute("DELETE FROM meta WHERE key IN ('startTime', 'duration')")
+                self.conn.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                      [('status', self._code(status))] + list(timing.items()))
+            # the run is over, publish the final status.yml (after the batch, if in one)
+            if status in (SUCCEEDED, SKIPPED, FAILED):
+                self._export_pending = True
+                if self._batch_depth == 0:
+                    self.flush()
+
+    def get_sim_status(self):
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'status'").fetchone()
+            return self._name(row[0]) if row else None
+
+    def task_counts(self, sedml: str):
+        return dict(+self._counts('tasks', 'document', self._document_id(sedml)))
+
+    def output_counts(self, sedml: str, output: str):
+        row = self.conn.execute('SELECT id FROM outputs WHERE document = ? AND name = ?',
+                                (self._document_id(sedml), output)).fetchone()
+        if row is None:
+            raise KeyError(output)
+        return dict(+self._counts('items', 'output', row[0]))
+
+    def aggregate_status(self, sedml: str = None, output: str = None):
+        # Rollup of one output, one SED document's tasks, or (no arguments) every task of the archive
+        if output is not None:
+            return rollup_status(Counter(self.output_counts(sedml, output)))
+        if sedml is not None:
+            return rollup_status(Counter(self.task_counts(sedml)))
+        return rollup_status(Counter({self._name(code): count for code, count in self.conn.execute(
+            'SELECT status, COUNT(*) FROM tasks GROUP BY status')}))
+
+    @property
+    def doc(self):
+        # status.yml document rebuilt from the tables
+        with self._lock:
+            meta = dict(self.conn.execute('SELECT key, value FROM meta'))
+            doc = {'sedDocuments': {}}
+            documents = {}
+            for doc_id, name, status in self.conn.execute('SELECT id, name, status FROM documents'):
+                documents[doc_id] = doc['sedDocuments'][name] = {
+                    'outputs': {}, 'tasks': {}, 'status': self._name(status)}
+
+            for doc_id, name, status, start_time, duration in self.conn.execute(
+                    'SELECT document, name, status, start_time, duration FROM tasks'):
+                task_dict = documents[doc_id]['tasks'][name] = {'status': self._name(status)}
+                if start_time is not None:
+                    task_dict['startTime'] = start_time
+                if duration is not None:
+                    task_dict['duration'] = duration
+
+            outputs = {}
+            for row_id, doc_id, name, kind, status in self.conn.execute(
+                    'SELECT id, document, name, kind, status FROM outputs'):
+                output = documents[doc_id]['outputs'][name] = {kind: {}, 'status': self._name(status)}
+                outputs[row_id] = output[kind]
+            for row_id, name, status in self.conn.execute('SELECT output, name, status FROM items'):
+                outputs[row_id][name] = self._name(status)
+
+            doc['status'] = self._name(meta.get('status'))
+            for key in ('startTime', 'duration'):
+                if key in meta:
+                    doc[key] = meta[key]
+            return doc
+
+    def flush(self):
+        # Export status.yml
+        with self._lock:
+            dump_yaml(self.path, self.doc)
+            self._export_pending = False
+
+    @contextmanager
+    def batch(self):
+        # Every update made inside the block in a single transaction
+        with self._lock:
+            with self._transaction():
+                self._batch_depth += 1
+                try:
+                    yield self
+                finally:
+                    self._batch_depth -= 1
+            if self._batch_depth == 0 and self._export_pending:
+                self.flush()
@@ -0,0 +1,372 @@
+import atexit
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import yaml
+
+try:
+    import fcntl
+except ImportError:  # no advisory locks (Windows), status updates then need a single writer
+    fcntl = None
+
+STATUS_FILE_NAME = "status.yml"
+STATUS_LOCK_FILE_NAME = ".status.lock"
+
+QUEUED = 'QUEUED'
+RUNNING = 'RUNNING'
+SUCCEEDED = 'SUCCEEDED'
+SKIPPED = 'SKIPPED'
+FAILED = 'FAILED'
+
+# Seconds between flushes of a dirty store, 0 writes status.yml after every update
+default_flush_interval = float(os.environ.get('VCELL_STATUS_FLUSH_INTERVAL', 0))
+
+# libyaml's C loader / emitter when PyYAML was built with it, the pure-Python ones write the same documents
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+YamlDumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+# 'yaml': status.yml is the store; 'sqlite': a status.sqlite sidecar is, status.yml is exported from it
+# (see status_db.py). Unset: sqlite if the output directory already has a sidecar with its tables, else yaml
+store_backend = os.environ.get('VCELL_STATUS_STORE') or None
+
+# Record when tasks / the simulation start RUNNING and add their `duration` (seconds) once they finish
+record_durations = os.environ.get('VCELL_STATUS_DURATIONS', '') not in ('', '0')
+
+# mkstemp creates 0600 files, give the renamed file the permissions a plain open() would have
+_umask = os.umask(0)
+os.umask(_umask)
+
+
+def rollup_status(counts: Counter):
+    # Aggregate of a set of task / data set statuses, None when there is nothing to aggregate
+    present = [status for status, count in counts.items() if count > 0]
+    if not present:
+        return None
+    if counts[FAILED] or any(status not in (QUEUED, RUNNING, SUCCEEDED, SKIPPED) for status in present):
+        return FAILED
+    if counts[RUNNING] or (counts[QUEUED] and len(present) > 1):
+        return RUNNING
+    if counts[QUEUED]:
+        return QUEUED
+    return SUCCEEDED
+
+
+@contextmanager
+def open_atomic(path: str, mode: str = 'w', **kwargs):
+    # Writes go to a temp file next to `path`, which replaces `path` only once the block completed
+    dir_name = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=dir_name)
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o666 & ~_umask)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def track_duration(entry: dict, status: str):
+    # startTime is kept in the entry itself, the status commands of a run are usually separate processes
+    if status == RUNNING:
+        entry['startTime'] = round(time.time(), 3)
+    elif status in (SUCCEEDED, SKIPPED, FAILED) and 'startTime' in entry:
+        entry['duration'] = round(time.time() - entry.pop('startTime'), 3)
+
+
+def write_atomic(path: str, text: str):
+    with open_atomic(path, encoding="utf-8") as f:
+        f.write(text)
+
+
+def load_yaml(path: str):
+    with open(path, 'r') as f:
+        return yaml.load(f, YamlLoader)
+
+
+def dump_yaml(path: str, doc: dict):
+    # emitted straight into the temp file, no intermediate string of the whole document
+    with open_atomic(path, encoding="utf-8") as f:
+        yaml.dump(doc, f, Dumper=YamlDumper)
+
+
+class FileLock:
+    # Exclusive advisory lock (flock) on a lock file, held by one process at a time; re-entrant in this process.
+    # The lock file is separate from status.yml, which is replaced (a new inode) on every write.
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._depth = 0
+        self._lock = threading.RLock()
+
+    def acquire(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666 & ~_umask)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            except BaseException:
+                os.close(fd)
+                self._lock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+def file_version(path):
+    # status.yml is only ever replaced, so a new inode (or mtime / size) means somebody else wrote it. `path` may
+    # be the descriptor of an open file: the version of exactly the content read from it.
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class StatusStore:
+    def __init__(self, out_dir: str, flush_interval: float = None, durations: bool = None):
+        self.path = os.path.join(out_dir, STATUS_FILE_NAME)
+        self.flush_interval = default_flush_interval if flush_interval is None else flush_interval
+        self.durations = record_durations if durations is None else durations
+        self._doc = None
+        self._task_counts = {}
+        self._output_counts = {}
+        self._sed_doc_names = {}
+        self._version = None
+        self._dirty = False
+        self._last_flush = 0.0
+        self._batch_depth = 0
+        self._timer = None
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(os.path.join(out_dir, STATUS_LOCK_FILE_NAME))
+
+    @property
+    def doc(self):
+        if self._doc is None:
+            self.load()
+        return self._doc
+
+    def load(self):
+        # also called without the file lock (get_store(), get_sim_status()): the version is taken from the file
+        # read, not the path, which another process may have replaced in between
+        with self._lock:
+            with open(self.path, 'r') as f:
+                self._version = file_version(f.fileno())
+                self._doc = yaml.load(f, YamlLoader)
+            self._count_statuses()
+            self._dirty = False
+
+    @contextmanager
+    def transaction(self):
+        # Read-modify-write of status.yml under the file lock: other processes' updates are read in first,
+        # and (unless debounced) ours are written before the lock is released, so none get lost
+        with self._lock, self._file_lock:
+            if not self._dirty and self.is_stale():
+                self.load()
+            yield self
+
+    def reset(self, doc: dict):
+        with self.transaction():
+            self._doc = doc
+            self._count_statuses()
+            self._changed()
+
+    def _count_statuses(self):
+        # One full pass per load, afterwards every update adjusts the counters in O(1)
+        self._task_counts = {}
+        self._output_counts = {}
+        self._sed_doc_names = {}
+        for name, sed_doc in self._doc.get('sedDocuments', {}).items():
+            self._task_counts[name] = Counter(task['status'] for task in sed_doc.get('tasks', {}).values())
+            for output_id, output in sed_doc.get('outputs', {}).items():
+                items = output.get('dataSets', output.get('curves', {}))
+                self._output_counts[(name, output_id)] = Counter(items.values())
+
+    def is_stale(self):
+        # True when somebody else rewrote status.yml since we last read or wrote it
+        if self._doc is None:
+            return False
+        version = file_version(self.path)
+        return version is not None and version != self._version
+
+    def sed_doc_name(self, sedml: str):
+        name = self._sed_doc_names.get(sedml)
+        if name is None:
+            name = self._sed_doc_names[sedml] = [i for i in list(self.doc['sedDocuments'].keys()) if sedml.endswith(i)][0]
+        return name
+
+    def document_names(self):
+        return list(self.doc['sedDocuments'].keys())
+
+    def set_task_status(self, sedml: str, task: str, status: str):
+        with self.transaction():
+            name = self.sed_doc_name(sedml)
+            sed_doc = self.doc['sedDocuments'][name]
+            task_dict = sed_doc['tasks'][task]
+
+            # Update task status and the SED-ML rollup
+            counts = self._task_counts[name]
+            counts[task_dict['status']] -= 1
+            counts[status] += 1
+            task_dict['status'] = status
+            if self.durations:
+                track_duration(task_dict, status)
+            sed_doc['status'] = rollup_status(counts)
+            self._changed()
+
+    def set_dataset_status(self, sedml: str, report: str, dataset: str, status: str):
+        with self.transaction():
+            name = self.sed_doc_name(sedml)
+            try:
+                output = self.doc['sedDocuments'][name]['outputs'][report]
+                old_status = output['dataSets'].get(dataset)
+            except KeyError:
+                return
+
+            # Update data set status and the report rollup
+            counts = self._output_counts[(name, report)]
+            if old_status is not None:
+                counts[old_status] -= 1
+            counts[status] += 1
+            output['dataSets'][dataset] = status
+            output['status'] = rollup_status(counts)
+            self._changed()
+
+    def task_counts(self, sedml: str):
+        return dict(+self._task_counts[self.sed_doc_name(sedml)])
+
+    def output_counts(self, sedml: str, output: str):
+        return dict(+self._output_counts[(self.sed_doc_name(sedml), output)])
+
+    def aggregate_status(self, sedml: str = None, output: str = None):
+        # Rollup of one output, one SED document's tasks, or (no arguments) every task of the archive
+        if self._doc is None:
+            self.load()
+        if output is not None:
+            return rollup_status(self._output_counts[(self.sed_doc_name(sedml), output)])
+        if sedml is not None:
+            return rollup_status(self._task_counts[self.sed_doc_name(sedml)])
+        return rollup_status(sum(self._task_counts.values(), Counter()))
+
+    def get_sim_status(self):
+        # as last written by anybody
+        with self._lock:
+            if self._doc is None or (not self._dirty and self.is_stale()):
+                self.load()
+            return self._doc.get('status')
+
+    def set_sim_status(self, status: str):
+        with self.transaction():
+            self.doc['status'] = status
+            if self.durations:
+                track_duration(self.doc, status)
+            self._changed()
+
+    def _changed(self):
+        self._dirty = True
+        if self._batch_depth == 0:
+            self.maybe_flush()
+
+    def maybe_flush(self):
+        with self._lock:
+            wait = self._last_flush + self.flush_interval - time.monotonic()
+            if wait <= 0:
+                self.flush()
+            elif self._timer is None:
+                # Debounced, make sure the pending changes still land on disk
+                self._timer = threading.Timer(wait, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            with self._file_lock:
+                dump_yaml(self.path, self._doc)
+                self._version = file_version(self.path)
+            self._last_flush = time.monotonic()
+            self._dirty = False
+
+    @contextmanager
+    def batch(self):
+        # Every update made inside the block in one locked transaction, written by a single flush. A block that
+        # raises writes nothing and leaves the store as status.yml has it.
+        with self.transaction():
+            if self._batch_depth == 0:
+                # pending (debounced) updates aren't part of the block, write them first
+                self.flush()
+            self._batch_depth += 1
+            completed = False
+            try:
+                yield self
+                completed = True
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    if completed:
+                        self.flush()
+                    else:
+                        # re-read (and re-counted) on next use
+                        self._doc = None
+                        self._dirty = False
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(out_dir: str):
+    key = os.path.abspath(out_dir)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            backend = store_backend
+            if backend is None:
+                from vcell_cli_utils.status_db import STATUS_DB_FILE_NAME, has_schema
+                backend = 'sqlite' if has_schema(os.path.join(out_dir, STATUS_DB_FILE_NAME)) else 'yaml'
+            if backend == 'sqlite':
+                from vcell_cli_utils.status_db import SqliteStatusStore
+                store = _stores[key] = SqliteStatusStore(key)
+            else:
+                store = _stores[key] = StatusStore(key)
+        elif not store._dirty and store.is_stale():
+            store.load()
+        return store
+
+
+def flush_all():
+    with _stores_lock:
+        stores = list(_stores.values())
+    # pending (debounced) changes only, a sqlite store has none
+    for store in stores:
+        if store._dirty:
+            store.flush()
+
+
+atexit.register(flush_all)
@@ -0,0 +1,338 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+from vcell_cli_utils import cli, status_store
+from vcell_cli_utils.profiling import profiled, stage
+from vcell_cli_utils.workspace import open_workspace
+
+# inotify event bits (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class Inotify:
+    # Wakes the watch loop as soon as a file in a watched directory is closed after writing or moved in,
+    # instead of waiting for the next poll. Linux only, see open_inotify().
+    def __init__(self, libc, fd: int):
+        self._libc = libc
+        self._fd = fd
+        self._dirs = {}
+
+    def add(self, dir_path: str):
+        if dir_path in self._dirs.values():
+            return
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dir_path), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd >= 0:
+            self._dirs[wd] = dir_path
+
+    def wait(self, timeout: float):
+        # paths of the files written or moved in, [] after `timeout` seconds without any
+        readable = select.select([self._fd], [], [], timeout)[0]
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 1 << 16)
+        except BlockingIOError:
+            return []
+
+        paths = []
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            wd, mask, cookie, name_len = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + name_len].rstrip(b'\0')
+            offset += name_len
+            if wd in self._dirs and name:
+                paths.append(os.path.join(self._dirs[wd], os.fsdecode(name)))
+        return paths
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def open_inotify():
+    # None where inotify isn't available, the watch loop then only polls
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    return Inotify(libc, fd)
+
+
+def file_key(path: str):
+    # (size, mtime) of a file, None once it's gone
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class SedDocumentWatch:
+    # Reports, plots and their dependencies of one SED document whose results go to <out_dir>/<location>
+    def __init__(self, location: str, sedml_path: str, out_dir: str, plots: bool = True):
+        from vcell_cli_utils.sedml_cache import sedml_summary
+
+        self.location = location
+        self.sedml_path = sedml_path
+        self.result_out_dir = os.path.join(out_dir, location)
+        self.outputs = {output['id']: output for output in sedml_summary(sedml_path)['outputs']}
+        self.converted = set()
+        self.rendered = set()
+
+        # plot -> reports its curves read
+        self.plot_reports = {}
+        if plots:
+            all_report_dataref, all_plot_curves = cli.get_all_dataref_and_curves(sedml_path)
+            try:
+                cli.update_dataref_with_report_label(all_report_dataref, all_plot_curves)
+            except cli.UnresolvedDataReferenceError as exception:
+                print("No plots for {}: {}".format(location, exception), file=sys.stderr)
+                all_plot_curves = {}
+            for plot, curves in all_plot_curves.items():
+                self.plot_reports[plot] = {data['report'] for data in curves.values()}
+
+    @property
+    def reports(self):
+        return {output_id for output_id, output in self.outputs.items() if output['type'] == 'report'}
+
+    def plot_csv_pending(self, plot: str):
+        # the simulator's own CSV of the plot (converted to reports.h5 like a report's) is there, not converted
+        # yet: rendering would replace it
+        return plot not in self.converted and os.path.isfile(os.path.join(self.result_out_dir, plot + '.csv'))
+
+    def ready_plots(self, final: bool = False):
+        # once the reports its curves read and the plot's own CSV are converted; the simulator may not write one,
+        # in the final pass the plots left are drawn anyway
+        return [plot for plot, reports in self.plot_reports.items()
+                if plot not in self.rendered and reports <= self.converted and (final or plot in self.converted)]
+
+
+class ReportWatch:
+    # Streaming execSedDoc: converts every report CSV of the archive to reports.h5 as soon as the simulator has
+    # finished writing it, marks the report's data sets SUCCEEDED in the status store and renders the plots
+    # whose reports (and the simulator's CSV of the plot itself) are all converted, while the simulation is still
+    # running.
+    #
+    # A CSV counts as complete once inotify saw it closed (or moved in) and it hasn't changed since, or, when
+    # polling, once its size and mtime stayed the same for `settle` seconds. After the simulation status is
+    # final every CSV left is complete. CSVs of execPlotOutputSedDoc (`__plot__`), CSVs that aren't an output
+    # of the SED document and the plot CSVs written here are left alone.
+    def __init__(self, base_out_path: str, workspace, plots: bool = True,
+                 settle: float = 2.0, h5_chunks: bool = True, h5_compression: str = 'gzip',
+                 h5_compression_level: int = 9, force: bool = False):
+        from biosimulators_utils.config import get_config
+
+        self.base_out_path = base_out_path
+        self.workspace = workspace
+        self.plots = plots
+        self.settle = settle
+        self.h5_options = dict(chunks=h5_chunks, compression=h5_compression, compression_level=h5_compression_level)
+        self.force = force
+        self.reports_h5 = os.path.join(base_out_path, get_config().H5_REPORTS_PATH)
+
+        self.documents = [SedDocumentWatch(content.location, workspace.file_path(content.location), base_out_path,
+                                           plots=plots)
+                          for content in workspace.sedml_contents]
+        self._unchanged_since = {}
+        self._closed = {}
+        self._handled = {}
+        # CSVs that didn't parse, retried once they change and in the final pass
+        self._failed = {}
+        self.converted_reports = []
+        self.failed_reports = []
+        self.rendered_plots = []
+
+    def has_status(self):
+        from vcell_cli_utils.status_db import STATUS_DB_FILE_NAME
+
+        return any(os.path.isfile(os.path.join(self.base_out_path, name))
+                   for name in (status_store.STATUS_FILE_NAME, STATUS_DB_FILE_NAME))
+
+    def simulation_finished(self):
+        return self.has_status() and status_store.get_store(self.base_out_path).get_sim_status() in (
+            status_store.SUCCEEDED, status_store.FAILED, status_store.SKIPPED)
+
+    def all_converted(self):
+        # every report of every SED document (there is at least one), and the plot CSVs the simulator wrote
+        return (any(document.reports for document in self.documents)
+                and all(document.reports <= document.converted
+                        and not any(document.plot_csv_pending(plot) for plot in document.plot_reports)
+                        for document in self.documents))
+
+    def closed(self, path: str):
+        # inotify: written and closed, complete unless it changes again
+        self._closed[path] = file_key(path)
+
+    def complete_csvs(self, final: bool = False):
+        # [(document, report id, CSV path, key)] of the CSVs ready to be converted
+        now = time.monotonic()
+        ready = []
+        for document in self.documents:
+            if not os.path.isdir(document.result_out_dir):
+                continue
+            for entry in os.scandir(document.result_out_dir):
+                report_id, extension = os.path.splitext(entry.name)
+                if extension != '.csv' or '__plot__' in report_id or report_id not in document.outputs:
+                    continue
+                key = file_key(entry.path)
+                if key is None or key[0] == 0 or self._handled.get(entry.path) == key \
+                        or (not final and self._failed.get(entry.path) == key):
+                    continue
+
+                if final or self._closed.get(entry.path) == key:
+                    ready.append((document, report_id, entry.path, key))
+                    continue
+                last_key, since = self._unchanged_since.get(entry.path, (None, now))
+                if last_key != key:
+                    self._unchanged_since[entry.path] = (key, now)
+                elif now - since >= self.settle:
+                    ready.append((document, report_id, entry.path, key))
+        return ready
+
+    def convert(self, ready: list, final: bool = False):
+        # After the simulation finished, a CSV that doesn't parse (or lacks a data set of its report) fails its
+        # report's data sets, and the final pass (see run_pass())
+        from vcell_cli_utils.manifest import OutputManifest
+        from vcell_cli_utils.reports import Hdf5ReportSession, read_vcell_csv
+
+        converted = []
+        failed = []
+        with OutputManifest(self.base_out_path, force=self.force) as manifest, \
+                Hdf5ReportSession(self.base_out_path, chunks=self.h5_options['chunks'],
+                                  compression=self.h5_options['compression'],
+                                  compression_opts=self.h5_options['compression_level']) as h5_writer:
+            for document, report_id, csv_path, key in ready:
+                rel_path = cli.get_report_rel_path(document.location, report_id)
+                signature = manifest.signature([document.sedml_path, csv_path], **self.h5_options)
+                if not (manifest.is_current('reports.h5:' + rel_path, signature) and h5_writer.contains(rel_path)):
+                    try:
+                        with stage('csv_parse', sedml=document.location, report=rel_path):
+                            data_set_arrays = read_vcell_csv(csv_path)
+                        report, data_set_results = cli.get_sed_report_results(document.outputs[report_id],
+                                                                               data_set_arrays)
+                    except (ValueError, KeyError) as exception:
+                        # still being written after all, retried once it changes (the simulation is over: an error)
+                        if final:
+                            failed.append((document, report_id, exception))
+                            self.failed_reports.append('{}: {}: {}'.format(rel_path, type(exception).__name__,
+                                                                           exception))
+                        else:
+                            self._failed[csv_path] = key
+                        continue
+                    with stage('h5_write', sedml=document.location, report=rel_path):
+                        h5_writer.write(report, data_set_results, rel_path)
+                    manifest.record('reports.h5:' + rel_path, signature)
+                self._handled[csv_path] = key
+                self._failed.pop(csv_path, None)
+                document.converted.add(report_id)
+                # a CSV that changed after all: its plots are drawn again
+                document.rendered -= {plot for plot, reports in document.plot_reports.items() if report_id in reports}
+                converted.append((document, report_id))
+                self.converted_reports.append(rel_path)
+
+        if (converted or failed) and self.has_status():
+            store = status_store.get_store(self.base_out_path)
+            report_statuses = [(document, report_id, status_store.SUCCEEDED) for document, report_id in converted]
+            report_statuses += [(document, report_id, status_store.FAILED) for document, report_id, _ in failed]
+            with store.batch():
+                for document, report_id, new_status in report_statuses:
+                    output = document.outputs[report_id]
+                    for data_set in output['data_sets'] if output['type'] == 'report' else []:
+                        store.set_dataset_status(document.location, report_id, data_set['id'], new_status)
+        return converted
+
+    def render(self, final: bool = False):
+        for document in self.documents:
+            plots = document.ready_plots(final=final)
+            if not plots:
+                continue
+            cli.gen_plot_pdfs(document.sedml_path, document.result_out_dir, force=self.force,
+                              reports_h5=self.reports_h5, plots=plots)
+            document.rendered.update(plots)
+            self.rendered_plots.extend(os.path.join(document.location, plot) for plot in plots)
+            # the plot CSVs just written replace the simulator's, converted before (or never written)
+            for plot in plots:
+                csv_path = os.path.join(document.result_out_dir, plot + '.csv')
+                self._handled[csv_path] = file_key(csv_path)
+
+    def run_pass(self, final: bool = False):
+        ready = self.complete_csvs(final=final)
+        if ready:
+            self.convert(ready, final=final)
+        if self.plots:
+            self.render(final=final)
+        if self.failed_reports:
+            # like execSedDoc, once the plots of the other reports are drawn
+            raise ValueError("Reports that couldn't be converted: {}".format('; '.join(self.failed_reports)))
+        return ready
+
+
+@profiled('watchSedDoc')
+def watch_sed_doc(omex_file_path, base_out_path, plots: bool = True, interval: float = 0.5, settle: float = 2.0,
+                  timeout: float = None, inotify: bool = True, h5_chunks: bool = True, h5_compression: str = 'gzip',
+                  h5_compression_level: int = 9, force: bool = False):
+    # Until the simulation status is final (SUCCEEDED, FAILED, SKIPPED; without a status.yml: until every report
+    # is converted) or `timeout` seconds passed. The CSVs are looked for every `interval` seconds, or right away
+    # when inotify reports one written.
+    start = time.monotonic()
+    notifier = open_inotify() if inotify else None
+    try:
+        with open_workspace(omex_file_path) as workspace:
+            watch = ReportWatch(base_out_path, workspace, plots=plots, settle=settle,
+                                h5_chunks=h5_chunks, h5_compression=h5_compression,
+                                h5_compression_level=h5_compression_level, force=force)
+            while True:
+                # checked before the scan, so every CSV the simulator wrote before it finished is seen as complete
+                finished = watch.simulation_finished()
+                watch.run_pass(final=finished)
+                if not finished and not watch.has_status() and watch.all_converted():
+                    # nothing tells whether more plot CSVs are coming: the plots left are drawn now
+                    if watch.plots:
+                        watch.render(final=True)
+                    break
+                if finished or (timeout is not None and time.monotonic() - start > timeout):
+                    break
+
+                if notifier is None:
+                    time.sleep(interval)
+                    continue
+                for document in watch.documents:
+                    if os.path.isdir(document.result_out_dir):
+                        notifier.add(document.result_out_dir)
+                for path in notifier.wait(interval):
+                    watch.closed(path)
+    finally:
+        if notifier is not None:
+            notifier.close()
+
+    return {
+        'reports': watch.converted_reports,
+        'plots': watch.rendered_plots,
+        'wall_time': round(time.monotonic() - start, 3),
+    }
+
+
+def main(omex_file_path: str, base_out_path: str, **kwargs):
+    # python watch.py <omex> <out_dir> [--noplots] [--interval S] [--settle S] [--timeout S] [--noinotify] [--force]
+    summary = watch_sed_doc(omex_file_path, base_out_path, **kwargs)
+    print("{} reports converted, {} plots rendered in {:.2f} s".format(
+        len(summary['reports']), len(summary['plots']), summary['wall_time']))
+
+
+if __name__ == "__main__":
+    import fire
+    fire.Fire(main)
@@ -0,0 +1,156 @@
+import atexit
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from vcell_cli_utils import status_store
+from vcell_cli_utils.profiling import stage
+
+# Unreferenced workspaces kept around for the next command on the same archive (server --noisolate)
+max_idle_workspaces = int(os.environ.get('VCELL_MAX_IDLE_WORKSPACES', 2))
+
+_workspaces = OrderedDict()
+_digests = {}
+_lock = threading.RLock()
+
+
+def archive_digest(omex_file: str):
+    # Content hash, memoized on (path, size, mtime) so repeated commands don't re-read the archive
+    stat = os.stat(omex_file)
+    key = (os.path.abspath(omex_file), stat.st_size, stat.st_mtime_ns)
+    digest = _digests.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(omex_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+        digest = _digests[key] = sha.hexdigest()
+    return digest
+
+
+class ArchiveWorkspace:
+    def __init__(self, omex_file: str, digest: str):
+        self.omex_file = omex_file
+        self.digest = digest
+        self.path = tempfile.mkdtemp(prefix='vcell_omex_')
+        self.ref_count = 0
+        self.owner_pid = os.getpid()
+        self._file_names = None
+        self._archive = None
+        self._sedml_contents = None
+
+    @property
+    def file_names(self):
+        # Archive listing straight from the zip directory, no extraction needed
+        if self._file_names is None:
+            with zipfile.ZipFile(self.omex_file) as zf:
+                self._file_names = [info.filename for info in zf.infolist() if not info.is_dir()]
+        return self._file_names
+
+    @property
+    def sedml_files(self):
+        return [name for name in self.file_names if name.endswith(".sedml")]
+
+    @property
+    def archive(self):
+        # The only place the archive gets unpacked
+        if self._archive is None:
+            from biosimulators_utils.combine.io import CombineArchiveReader
+            with stage('archive_extract', archive=os.path.basename(self.omex_file)):
+                self._archive = CombineArchiveReader().run(in_file=self.omex_file, out_dir=self.path,
+                                                           try_reading_as_plain_zip_archive=True)
+        return self._archive
+
+    @property
+    def sedml_contents(self):
+        if self._sedml_contents is None:
+            from biosimulators_utils.combine.utils import get_sedml_contents
+            self._sedml_contents = get_sedml_contents(self.archive)
+        return self._sedml_contents
+
+    def extract(self):
+        self.archive
+        return self.path
+
+    def file_path(self, location: str):
+        path = os.path.join(self.path, location)
+        if self._archive is None and not os.path.isfile(path):
+            # Before the full unpack, pull out just the requested member
+            member = os.path.normpath(location).replace(os.sep, '/')
+            if member in self.file_names:
+                with zipfile.ZipFile(self.omex_file) as zf:
+                    zf.extract(member, self.path)
+            else:
+                self.extract()
+        return path
+
+    def copy_to(self, out_dir: str):
+        # Real copies rather than links, callers are free to overwrite files in out_dir
+        shutil.copytree(self.extract(), out_dir, dirs_exist_ok=True)
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def acquire_workspace(omex_file: str):
+    if not os.path.isfile(omex_file):
+        raise FileNotFoundError("File does not exist: {}".format(omex_file))
+
+    if not zipfile.is_zipfile(omex_file):
+        raise IOError("File is not an OMEX Combine Archive in zip format: {}".format(omex_file))
+
+    digest = archive_digest(omex_file)
+    with _lock:
+        workspace = _workspaces.get(digest)
+        if workspace is None or not os.path.isdir(workspace.path):
+            workspace = _workspaces[digest] = ArchiveWorkspace(omex_file, digest)
+        _workspaces.move_to_end(digest)
+        workspace.ref_count += 1
+        return workspace
+
+
+def release_workspace(workspace: ArchiveWorkspace):
+    with _lock:
+        workspace.ref_count -= 1
+        idle = [digest for digest, ws in _workspaces.items() if ws.ref_count <= 0]
+        # Oldest idle workspaces go first, anything still referenced is left alone
+        for digest in idle[:max(len(idle) - max_idle_workspaces, 0)]:
+            evicted = _workspaces.pop(digest)
+            if evicted.owner_pid == os.getpid():
+                evicted.cleanup()
+
+
+@contextmanager
+def open_workspace(omex_file: str):
+    workspace = acquire_workspace(omex_file)
+    try:
+        yield workspace
+    finally:
+        release_workspace(workspace)
+
+
+def cleanup_workspaces():
+    # Only the workspaces this process created, forked children share the parent's table
+    with _lock:
+        for digest, workspace in list(_workspaces.items()):
+            if workspace.owner_pid == os.getpid():
+                _workspaces.pop(digest).cleanup()
+
+
+atexit.register(cleanup_workspaces)
+
+
+@contextmanager
+def forked_child_cleanup():
+    # What exiting would do for a forked child (server, batch, benchmarks), which skips atexit handlers:
+    # write the pending status updates and remove the workspaces it extracted
+    try:
+        yield
+    finally:
+        status_store.flush_all()
+        cleanup_workspaces()